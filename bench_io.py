@@ -0,0 +1,57 @@
+# Compares how fast open_file reads a customer list, plain and compressed
+import argparse
+import os
+import tempfile
+import time
+import zipfile
+import numpy as np
+import pandas as pd
+from cli import open_file
+
+def make_list(rows):
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        'CustomerNumber': rng.choice(10 ** 9, rows, replace=False) + 10 ** 9,
+        'Chances': rng.choice([1, 2, 5, 10], rows),
+    })
+
+def write_inputs(df, folder, members):
+    paths = {'csv': os.path.join(folder, 'list.csv')}
+    df.to_csv(paths['csv'], index=False)
+    for extension in ('gz', 'bz2', 'xz', 'zst'):
+        path = os.path.join(folder, f'list.csv.{extension}')
+        try:
+            df.to_csv(path, index=False)
+        except ImportError:
+            continue  # zstandard is not installed
+        paths[f'csv.{extension}'] = path
+    paths['zip'] = os.path.join(folder, 'list.zip')
+    df.to_csv(paths['zip'], index=False)
+    paths[f'zip x{members}'] = os.path.join(folder, 'parts.zip')
+    with zipfile.ZipFile(paths[f'zip x{members}'], 'w', zipfile.ZIP_DEFLATED) as archive:
+        for i, part in enumerate(np.array_split(np.arange(len(df)), members)):
+            archive.writestr(f'part{i}.csv', df.iloc[part].to_csv(index=False))
+    return paths
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time open_file on plain and compressed CSV")
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--members", type=int, default=4, help="CSV members in the multi-member zip")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        paths = write_inputs(make_list(args.rows), folder, args.members)
+        raw_size = os.path.getsize(paths['csv'])
+        print(f"{args.rows} rows, {raw_size / 1e6:.1f} MB as plain CSV")
+        print(f"{'input':<10} {'size MB':>8} {'seconds':>8} {'MB/s':>8} {'Mrows/s':>8}")
+        for name, path in paths.items():
+            seconds = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                open_file(path)
+                seconds.append(time.perf_counter() - start)
+            best = min(seconds)
+            # Throughput is measured in uncompressed bytes so every row is comparable
+            print(f"{name:<10} {os.path.getsize(path) / 1e6:>8.1f} {best:>8.3f} "
+                  f"{raw_size / 1e6 / best:>8.1f} {args.rows / 1e6 / best:>8.2f}")
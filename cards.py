@@ -0,0 +1,98 @@
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+# Figure and PdfPages render without pyplot, so workers never touch the GUI backend
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_pdf import PdfPages
+from matplotlib.collections import PolyCollection
+from matplotlib.patches import Rectangle
+
+# Code 39 patterns for the characters a customer number can contain. Each character is
+# 5 bars and 4 spaces, alternating and starting with a bar, n = narrow and w = wide.
+CODE39 = {
+    '0': 'nnnwwnwnn', '1': 'wnnwnnnnw', '2': 'nnwwnnnnw', '3': 'wnwwnnnnn', '4': 'nnnwwnnnw',
+    '5': 'wnnwwnnnn', '6': 'nnwwwnnnn', '7': 'nnnwnnwnw', '8': 'wnnwnnwnn', '9': 'nnwwnnwnn',
+    '-': 'nwnnnnwnw', '*': 'nwnnwnwnn',
+}
+WIDE = 2.5  # Width of a wide element in narrow units
+
+PAGE_SIZE = (8.5, 11)  # Letter, in inches
+CARD_COLUMNS = 2
+
+def barcode_bars(text):
+    """ returns (start, width) of every bar of the Code 39 barcode of text, in narrow units
+    """
+    bars = []
+    x = 0.0
+    for char in f"*{text}*":
+        for element, width in enumerate(CODE39[char]):
+            width = WIDE if width == 'w' else 1.0
+            if element % 2 == 0:
+                bars.append((x, width))
+            x += width
+        x += 1.0  # Narrow gap between characters
+    return bars, x - 1.0
+
+def card_rows(df):
+    """ returns (customer, section, seat) of every seated winner, in seat order
+    """
+    winners = df if (df['Winner'] == "?").all() else df[df['Winner'] == True]
+    winners = winners.sort_values(by='Seat')
+    sections = winners['Section'].astype(str) if 'Section' in winners else [""] * len(winners)
+    return list(zip(winners['CustomerNumber'].astype(np.int64).tolist(), list(sections),
+                    winners['Seat'].astype(np.int64).tolist()))
+
+def draw_card(ax, x, y, width, height, customer, section, seat):
+    # Everything on a page shares one axes in page coordinates, which keeps rendering cheap
+    ax.add_patch(Rectangle((x, y), width, height, fill=False, linewidth=0.8, linestyle='--'))
+    center = x + width / 2
+    ax.text(center, y + 0.78 * height, f"Seat {seat}", ha='center', va='center', fontsize=24, weight='bold')
+    if section:
+        ax.text(center, y + 0.58 * height, f"Section {section}", ha='center', va='center', fontsize=14)
+    ax.text(center, y + 0.44 * height, f"Customer {customer}", ha='center', va='center', fontsize=11)
+    # The bars are returned rather than drawn, so a page draws all of them as one collection
+    bars, length = barcode_bars(str(customer))
+    scale = 0.8 * width / length
+    bottom, top = y + 0.08 * height, y + 0.33 * height
+    return [[(left, bottom), (left, top), (left + bar * scale, top), (left + bar * scale, bottom)]
+            for left, bar in ((x + 0.1 * width + start * scale, bar) for start, bar in bars)]
+
+def render_batch(file_name, rows, cards_per_page):
+    # Runs in a worker process: one part file of several pages, each page freed once written
+    card_rows_per_page = -(-cards_per_page // CARD_COLUMNS)
+    width = 1.0 / CARD_COLUMNS
+    height = 1.0 / card_rows_per_page
+    with PdfPages(file_name) as pdf:
+        for page_start in range(0, len(rows), cards_per_page):
+            fig = Figure(figsize=PAGE_SIZE)
+            ax = fig.add_axes((0, 0, 1, 1))
+            ax.set_xlim(0, 1)
+            ax.set_ylim(0, 1)
+            ax.set_axis_off()
+            bars = []
+            for i, (customer, section, seat) in enumerate(rows[page_start:page_start + cards_per_page]):
+                column, row = i % CARD_COLUMNS, i // CARD_COLUMNS
+                bars += draw_card(ax, column * width + 0.02, 1 - (row + 1) * height + 0.01, width - 0.04,
+                                  height - 0.02, customer, section, seat)
+            ax.add_collection(PolyCollection(bars, facecolors='black', edgecolors='none'))
+            pdf.savefig(fig)
+    return file_name
+
+def render_cards(df, out_dir, cards_per_page=10, pages_per_file=50, workers=None):
+    """ renders a seat card per winner into multi-page PDF part files in out_dir, one part per
+    batch of pages rendered by its own worker process. Returns the part file names in seat order.
+    """
+    try:
+        rows = card_rows(df)
+        os.makedirs(out_dir, exist_ok=True)
+        batch_size = cards_per_page * pages_per_file
+        batches = [(os.path.join(out_dir, f"seat_cards_{i + 1:04d}.pdf"), rows[start:start + batch_size], cards_per_page)
+                   for i, start in enumerate(range(0, len(rows), batch_size))]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            files = list(pool.map(render_batch, *zip(*batches))) if batches else []
+        logging.info(f"Rendered {len(rows)} seat cards to {len(files)} files in {out_dir}")
+        return files
+    except Exception as e:
+        logging.error(f"Failed to render seat cards: {str(e)}")
+        raise ValueError(f"Failed to render seat cards: {str(e)}")
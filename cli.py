@@ -1,24 +1,330 @@
 import pandas as pd
 import numpy as np
+import argparse
+import hashlib
 import logging
+import multiprocessing
+import os
 import traceback
+import zipfile
+from sqlite_store import SQLITE_EXTENSIONS, draw_sqlite, open_sqlite, read_results, save_sqlite
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import shared_memory
 
 # Configure logging
 logging.basicConfig(filename='log.csv', level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-# Weighted random selection without replacement
-def weighted_random_selection(obj, weights, n):
-    weights = weights / weights.sum()
-    return np.random.choice(obj, n, p=weights, replace=False)
+# Plain and compressed CSV. pandas picks the decompressor from the extension and parses straight
+# from the decompressed stream, so nothing is unpacked to disk. .zst needs the zstandard package.
+CSV_EXTENSIONS = ('.csv', '.csv.gz', '.csv.bz2', '.csv.xz', '.csv.zst', '.zip')
+
+# Spreadsheet file types open_file can read, SQLite databases are handled separately
+INPUT_EXTENSIONS = ('.xls', '.xlsx') + CSV_EXTENSIONS
+
+# Rows per independently seeded random stream. A row's key depends only on the
+# seed and the block it falls in, so splitting the list on block boundaries
+# across processes reproduces the single-process draw exactly.
+DRAW_BLOCK_SIZE = 1 << 20
+
+# Lists with at most this many distinct Chances values are drawn tier by tier
+TIER_LIMIT = 32
+# A tier draw spends about as long per seat and tier as the key engine spends on this many rows,
+# so 'auto' only draws by tier while k * tiers * TIER_SEAT_COST stays below the number of rows
+TIER_SEAT_COST = 8
+# Rows looked at to rule out the tier engine before counting the distinct values of every row
+TIER_SAMPLE_SIZE = 4096
+
+# Alias tables and weight tiers can be built once per loaded list and reused for every later
+# draw against it. Callers that draw repeatedly name the list with a cache_key, which must
+# change whenever its Chances do; without a key the table is built for the one draw.
+TABLE_CACHE_SIZE = 8
+_tables = {}
+
+def cached_table(kind, weights, build, cache_key=None):
+    if cache_key is None:
+        return build(weights)
+    key = (kind, cache_key)
+    if key not in _tables or _tables[key][0] != len(weights):
+        if key not in _tables and len(_tables) >= TABLE_CACHE_SIZE:
+            _tables.pop(next(iter(_tables)))
+        _tables[key] = (len(weights), build(weights))
+    return _tables[key][1]
+
+# Weighted random selection, without replacement for seat draws, with replacement for prize raffles
+def weighted_random_selection(obj, weights, n, replace=False, seed=None):
+    """ returns n items of obj drawn with probability proportional to weights, in draw order.
+    Both modes go through the seeded engines, so the same seed gives the same selection.
+    """
+    weights = np.asarray(weights, dtype=np.float64)
+    if seed is None:
+        seed = new_seed()
+    if replace:
+        prob, alias = alias_table(weights)
+        return np.asarray(obj)[alias_sample(prob, alias, n, np.random.default_rng(seed))]
+    return np.asarray(obj)[draw_order(weights, n, seed)]
+
+def build_alias_table(weights):
+    """ builds Walker/Vose alias tables in a few vectorized passes. Drawing column i uniformly and keeping it with
+    probability prob[i], otherwise taking alias[i], samples rows proportionally to weights.
+    """
+    weights = np.asarray(weights, dtype=np.float64)
+    n = len(weights)
+    if n == 0 or not np.isfinite(weights).all() or (weights < 0).any() or weights.sum() <= 0:
+        raise ValueError("Chances must be finite, non-negative and not all zero")
+    scaled = weights * (n / weights.sum())
+    prob = np.ones(n)
+    alias = np.arange(n)
+    small = np.flatnonzero(scaled < 1.0)
+    large = np.flatnonzero(scaled > 1.0)
+    if len(small) and len(large):
+        # Vose's pairing without the loop. Large rows hand out their excess over 1 in turn, so on
+        # the running totals of deficits and excesses every small row is filled by the large row
+        # whose share it starts in. A large row that gives past its excess is filled up by the next.
+        deficit = np.cumsum(1.0 - scaled[small])
+        excess = np.cumsum(scaled[large] - 1.0)
+        starts = np.concatenate(([0.0], deficit[:-1]))
+        donor = np.minimum(np.searchsorted(excess, starts, side='right'), len(large) - 1)
+        prob[small] = scaled[small]
+        alias[small] = large[donor]
+        last = np.searchsorted(deficit, excess[:-1], side='left')
+        drained = np.flatnonzero(last < len(small))
+        prob[large[drained]] = np.clip(1.0 + excess[drained] - deficit[last[drained]], 0.0, 1.0)
+        alias[large[drained]] = large[drained + 1]
+    # Rows left at prob 1 only differ from 1 by rounding error
+    return prob, alias
+
+def alias_table(weights, cache_key=None):
+    return cached_table('alias', weights, build_alias_table, cache_key)
+
+def alias_sample(prob, alias, n, rng):
+    """ returns n row positions drawn with replacement from alias tables, O(1) per draw
+    """
+    columns = rng.integers(0, len(prob), size=n)
+    keep = rng.random(n) < prob[columns]
+    return np.where(keep, columns, alias[columns])
+
+def new_seed():
+    # Fresh entropy from the OS, logged with every draw so it can be replayed
+    return int(np.random.SeedSequence().entropy)
+
+def draw_keys(weights, seed, offset=0, block_size=DRAW_BLOCK_SIZE):
+    """ returns exponential race keys for rows offset .. offset+len(weights). Drawing rows in
+    ascending key order is a weighted draw without replacement. Zero weights get an infinite key.
+    Every block_size rows share one seeded stream, so the keys also depend on block_size.
+    """
+    weights = np.asarray(weights, dtype=np.float64)
+    keys = np.empty(len(weights))
+    end = offset + len(weights)
+    block = offset // block_size
+    while block * block_size < end:
+        block_start = block * block_size
+        lo = max(offset, block_start)
+        hi = min(end, block_start + block_size)
+        rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(block,)))
+        noise = rng.standard_exponential(hi - block_start)[lo - block_start:]
+        with np.errstate(divide='ignore'):
+            keys[lo - offset:hi - offset] = noise / weights[lo - offset:hi - offset]
+        block += 1
+    return keys
+
+def top_k(keys, k, offset=0):
+    """ returns (positions + offset, keys) of the k smallest keys, ordered by key then position
+    """
+    if k < len(keys):
+        positions = np.argpartition(keys, k - 1)[:k] if k > 0 else np.arange(0)
+    else:
+        positions = np.arange(len(keys))
+    positions = positions[np.lexsort((positions, keys[positions]))]
+    return positions + offset, keys[positions]
+
+def _shard_top_k(source, length, start, stop, seed, k, block_size):
+    # Runs in a worker process. `source` names either a shared memory block or a .npy file,
+    # so the weights are mapped rather than pickled; only the k local winners travel back.
+    # block_size is passed in rather than read from the module, which a spawned worker re-imports.
+    if source.endswith('.npy'):
+        weights = np.load(source, mmap_mode='r')[start:stop]
+        return top_k(draw_keys(weights, seed, start, block_size), k, start)
+    shm = shared_memory.SharedMemory(name=source)
+    try:
+        weights = np.ndarray((length,), dtype=np.float64, buffer=shm.buf)[start:stop]
+        keys = draw_keys(weights, seed, start, block_size)
+        del weights
+        return top_k(keys, k, start)
+    finally:
+        shm.close()
+
+def shard_bounds(length, workers, block_size=DRAW_BLOCK_SIZE):
+    # Split the rows into at most `workers` contiguous shards aligned to block_size
+    num_blocks = -(-length // block_size)
+    cuts = np.linspace(0, num_blocks, min(workers, num_blocks) + 1).round().astype(np.int64)
+    cuts = np.minimum(np.unique(cuts) * block_size, length)
+    return list(zip(cuts[:-1], cuts[1:]))
+
+def sharded_draw_order(weights, k, seed, workers, block_size=DRAW_BLOCK_SIZE):
+    """ weighted draw of k rows across a process pool. `weights` is an array or the path of a .npy
+    file. Returns the same positions, in the same order, as the single-process draw for the seed.
+    """
+    shm = None
+    try:
+        if isinstance(weights, str):
+            source = weights
+            length = len(np.load(weights, mmap_mode='r'))
+        else:
+            weights = np.ascontiguousarray(weights, dtype=np.float64)
+            length = len(weights)
+            shm = shared_memory.SharedMemory(create=True, size=max(weights.nbytes, 1))
+            np.ndarray((length,), dtype=np.float64, buffer=shm.buf)[:] = weights
+            source = shm.name
+        bounds = shard_bounds(length, workers, block_size)
+        with ProcessPoolExecutor(max_workers=len(bounds)) as pool:
+            futures = [pool.submit(_shard_top_k, source, length, start, stop, seed, min(k, stop - start), block_size)
+                       for start, stop in bounds]
+            results = [future.result() for future in futures]
+        # Shards come back in row order, so merged positions break key ties the same way
+        positions = np.concatenate([result[0] for result in results])
+        keys = np.concatenate([result[1] for result in results])
+        merged, _ = top_k(keys, k)
+        return positions[merged]
+    finally:
+        if shm is not None:
+            shm.close()
+            shm.unlink()
+
+def build_tiers(weights, limit=TIER_LIMIT):
+    """ groups rows by their distinct weight in O(n). Returns (values, members) with the row
+    positions of each tier, or None when there are more than `limit` distinct weights.
+    """
+    # A strided sample with too many values rules the tiers out without hashing every row
+    sample = weights[::max(1, len(weights) // TIER_SAMPLE_SIZE)]
+    if len(np.unique(sample)) > limit:
+        return None
+    # NaN gets a tier of its own, so draw_order can reject it from the tier values
+    tier, values = pd.factorize(weights, use_na_sentinel=False)
+    if len(values) > limit:
+        return None
+    # Tier numbers fit in a byte, so the stable argsort below is a linear radix sort
+    tier = tier.astype(np.uint8)
+    rows = np.argsort(tier, kind='stable')
+    counts = np.bincount(tier, minlength=len(values))
+    return np.asarray(values, dtype=np.float64), np.split(rows, np.cumsum(counts)[:-1])
+
+def tier_table(weights, limit=TIER_LIMIT, cache_key=None):
+    return cached_table(f'tiers{limit}', weights, lambda weights: build_tiers(weights, limit), cache_key)
+
+def tier_draw_order(tiers, k, seed):
+    """ weighted draw of k rows without replacement from build_tiers() output. Each seat first picks
+    a tier by its remaining weight, O(tiers) per seat, then the seats of a tier are filled uniformly.
+    """
+    values, members = tiers
+    rng = np.random.default_rng(seed)
+    weights = values.tolist()
+    counts = [len(rows) for rows in members]
+    masses = [weight * count for weight, count in zip(weights, counts)]
+    sequence = np.empty(k, dtype=np.int64)
+    for seat, u in enumerate(rng.random(k).tolist()):
+        target = u * sum(masses)
+        picked = None
+        for t, mass in enumerate(masses):
+            if mass > 0:
+                picked = t
+                if target < mass:
+                    break
+                target -= mass
+        sequence[seat] = picked
+        counts[picked] -= 1
+        masses[picked] = weights[picked] * counts[picked]
+    order = np.empty(k, dtype=np.int64)
+    for t, rows in enumerate(members):
+        seats = np.flatnonzero(sequence == t)
+        if len(seats):
+            order[seats] = rows[rng.choice(len(rows), len(seats), replace=False)]
+    return order
+
+def check_weights(weights):
+    # A negative Chances would give a negative race key and always be drawn first, NaN never sorts
+    if not np.isfinite(weights).all() or (weights < 0).any():
+        raise ValueError("Chances must be finite and non-negative")
+
+def draw_order(weights, k, seed, workers=1, engine="auto", cache_key=None, block_size=DRAW_BLOCK_SIZE):
+    """ returns the positions of k rows drawn without replacement with probability proportional
+    to weights, in draw order. engine is "keys", "tiers" or "auto", which uses tiers when Chances
+    takes few distinct values and k is small next to the list. Keys draws longer than one block are
+    sharded over `workers` processes. cache_key lets repeated draws reuse the list's tiers.
+    """
+    weights = np.asarray(weights, dtype=np.float64)
+    if engine not in ("auto", "keys", "tiers"):
+        raise ValueError(f"Unknown draw engine: {engine}")
+    # The choice only depends on the weights and k, so a seed replays the same draw anywhere
+    tiers = None
+    if engine == "tiers" or (engine == "auto" and k * TIER_SEAT_COST <= len(weights)):
+        tiers = tier_table(weights, TIER_LIMIT if engine == "auto" else 255, cache_key)
+        if tiers is None and engine == "tiers":
+            raise ValueError("Too many distinct Chances values for the tier engine")
+        if tiers is not None and engine == "auto" and k * len(tiers[0]) * TIER_SEAT_COST > len(weights):
+            tiers = None
+    # With tiers the checks only look at the distinct values, so a warm draw never scans every row
+    check_weights(weights if tiers is None else tiers[0])
+    drawable = np.count_nonzero(weights) if tiers is None else sum(len(rows) for value, rows in zip(*tiers) if value > 0)
+    if k > drawable:
+        raise ValueError("Fewer customers with non-zero Chances than number of tickets")
+    if tiers is not None:
+        return tier_draw_order(tiers, k, seed)
+    if workers and workers > 1 and len(weights) > block_size:
+        return sharded_draw_order(weights, k, seed, workers, block_size)
+    return top_k(draw_keys(weights, seed, 0, block_size), k)[0]
+
+def apply_draw(df, order, num_entered):
+    """ marks the rows at positions `order` (in draw order) as winners and assigns seats
+    """
+    if num_entered:
+        winner = np.zeros(len(df), dtype=bool)
+        winner[order] = True
+        # Mark winners in the 'Winner' column, on a new frame so the loaded list stays untouched
+        df = df.assign(Winner=winner)
+        df = df.sort_values(by=['Winner', 'Chances'], ascending=False, kind='stable')
+        df['Seat'] = range(1, len(df) + 1)
+    else:
+        # Seats follow draw order, winners are marked as question marks
+        seat = np.zeros(len(df), dtype=np.int64)
+        seat[order] = np.arange(1, len(order) + 1)
+        df = df.assign(Winner="?", Seat=seat)
+        df = df.sort_values(by=['Winner', 'Chances'], ascending=False, kind='stable')
+    return df
+
+def read_zip_member(file_path, member):
+    # Each thread opens the archive itself, a ZipFile handle is not safe to share
+    with zipfile.ZipFile(file_path) as archive, archive.open(member) as stream:
+        return pd.read_csv(stream)
+
+def read_csv_file(file_path, workers=None):
+    """ reads a plain or compressed CSV file. The CSV members of a zip archive are decompressed
+    and parsed in parallel threads and concatenated in archive order.
+    """
+    if not file_path.endswith('.zip'):
+        return pd.read_csv(file_path)
+    with zipfile.ZipFile(file_path) as archive:
+        members = [name for name in archive.namelist() if not name.endswith('/') and not name.startswith('__MACOSX/')]
+    # Prefer the CSV members when the archive also holds other files
+    members = [name for name in members if name.lower().endswith('.csv')] or members
+    if not members:
+        raise ValueError("No CSV file in the zip archive")
+    if len(members) == 1:
+        return read_zip_member(file_path, members[0])
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        parts = list(pool.map(lambda member: read_zip_member(file_path, member), members))
+    return pd.concat(parts, ignore_index=True)
 
 def open_file(file_path):
     try:
         if file_path.endswith(('.xls', '.xlsx')):
             df = pd.read_excel(file_path)
             file_type = 'excel'
-        elif file_path.endswith('.csv'):
-            df = pd.read_csv(file_path)
+        elif file_path.endswith(CSV_EXTENSIONS):
+            df = read_csv_file(file_path)
             file_type = 'csv'
+        elif file_path.endswith(SQLITE_EXTENSIONS):
+            df = open_sqlite(file_path)
+            file_type = 'sqlite'
         else:
             raise ValueError("Unsupported file format")
         
@@ -29,7 +335,7 @@ def open_file(file_path):
         logging.error(f"Failed to open file: {str(e)}")
         raise ValueError(f"Failed to open file: {str(e)}")
 
-def generate_tickets(df, num_tickets, num_entered):
+def generate_tickets(df, num_tickets, num_entered, seed=None, workers=1, weights=None, cache_key=None):
     try:
         if num_tickets <= 0:
             raise ValueError("Number of tickets must be positive")
@@ -37,26 +343,15 @@ def generate_tickets(df, num_tickets, num_entered):
         if num_tickets > len(df):
             raise ValueError(f"Number of tickets must be less than or equal to the number of records")
         
-        logging.info(f"Generating winners, num given: {num_tickets}")
+        if seed is None:
+            seed = new_seed()
+        logging.info(f"Generating winners, num given: {num_tickets}, seed: {seed}")
         
-        weights = df['Chances'] / df['Chances'].sum()
-        if num_entered:
-            # Randomly select winners' indices based on weights
-            print("num_tickets: ", num_tickets)
-            winners_indices = np.random.choice(df.index, num_tickets, p=weights, replace=False)
-            # Mark winners in the 'Winner' column
-            df['Winner'] = False
-            df.loc[winners_indices, 'Winner'] = True
-            df = df.sort_values(by=['Winner', 'Chances'], ascending=False)
-            df['Seat'] = range(1, len(df) + 1)
-        else:
-            # Randomly select CustomerNumbers as winners without actual indices
-            winners_indices = np.random.choice(df['CustomerNumber'], num_tickets, p=weights, replace=False)
-            # Mark winners as question marks in the 'Winner' column
-            df['Winner'] = "?"
-            df = df.sort_values(by=['Winner', 'Chances'], ascending=False)
-            for i in range(len(df)):
-                df.loc[df['CustomerNumber'] == winners_indices[i], 'Seat'] = i + 1
+        # Positions of the winners in draw order, weights default to the Chances column
+        if weights is None:
+            weights = df['Chances'].to_numpy()
+        order = draw_order(weights, num_tickets, seed, workers, cache_key=cache_key)
+        df = apply_draw(df, order, num_entered)
     
         num_winners = df['Winner'].value_counts()
         logging.info(f"Number of winners: {num_winners.to_string(header=False)}")
@@ -67,13 +362,160 @@ def generate_tickets(df, num_tickets, num_entered):
         logging.error(f"Failed to generate tickets: {str(e)}")
         raise ValueError(f"Failed to generate tickets: {str(e)}")
 
+def generate_prizes(df, num_prizes, seed=None, cache_key=None, weights=None):
+    try:
+        if num_prizes <= 0:
+            raise ValueError("Number of prizes must be positive")
+
+        if seed is None:
+            seed = new_seed()
+        logging.info(f"Drawing prizes with replacement, num given: {num_prizes}, seed: {seed}")
+
+        # A customer can win several times, so count the wins of every row. Weights default to
+        # the Chances column
+        if weights is None:
+            weights = df['Chances'].to_numpy()
+        prob, alias = alias_table(weights, cache_key)
+        winners = alias_sample(prob, alias, num_prizes, np.random.default_rng(seed))
+        # On a new frame, like apply_draw, so the caller's list stays untouched
+        df = df.assign(Wins=np.bincount(winners, minlength=len(df)))
+        df = df.sort_values(by=['Wins', 'Chances'], ascending=False, kind='stable')
+
+        logging.info(f"Number of prize winners: {np.count_nonzero(df['Wins'])}")
+        return df
+    except Exception as e:
+        traceback.print_exc()
+        logging.error(f"Failed to draw prizes: {str(e)}")
+        raise ValueError(f"Failed to draw prizes: {str(e)}")
+
+def parse_quota(quota):
+    # A quota is a number of seats ("50") or a share of the group ("20%")
+    quota = str(quota).strip()
+    if quota.endswith('%'):
+        return float(quota[:-1]) / 100, True
+    return int(quota), False
+
+def group_name(group):
+    # Groups are matched by name. A numeric column with blank cells is read as floats, so 1.0 is "1"
+    if pd.isna(group):
+        return ''
+    if isinstance(group, (float, np.floating)) and float(group).is_integer():
+        return str(int(group))
+    return str(group)
+
+def generate_stratified(df, column, quotas, seed=None):
+    """ draws a fixed number of winners from each group of `column`. quotas maps group values to
+    a seat count or a percentage of the group, e.g. {"Gold": 50, "Silver": "20%"}; groups without
+    a quota get no seats. All groups are drawn in one pass: rows are ordered by group, then by
+    their race key, and the first quota rows of every group win. Winners are seated group by
+    group in the order of quotas, by Chances within a group, followed by everyone else.
+    """
+    try:
+        if seed is None:
+            seed = new_seed()
+        logging.info(f"Generating stratified winners by {column}, quotas: {quotas}, seed: {seed}")
+        # Group codes start at 1, code 0 collects empty cells and groups without a quota
+        codes, groups = pd.factorize(df[column])
+        codes = codes + 1
+        names = [group_name(group) for group in groups]
+        unknown = set(map(group_name, quotas)) - set(names)
+        if unknown:
+            raise ValueError(f"No {column} group named {', '.join(sorted(unknown))}")
+        weights = df['Chances'].to_numpy(dtype=np.float64)
+        check_weights(weights)
+        sizes = np.bincount(codes, minlength=len(groups) + 1)
+        drawable = np.bincount(codes, weights=weights > 0, minlength=len(groups) + 1).astype(np.int64)
+        seats = np.zeros(len(groups) + 1, dtype=np.int64)
+        priority = np.full(len(groups) + 1, len(quotas), dtype=np.int64)
+        for rank, (group, quota) in enumerate(quotas.items()):
+            code = names.index(group_name(group)) + 1
+            value, is_share = parse_quota(quota)
+            seats[code] = round(value * sizes[code]) if is_share else value
+            priority[code] = rank
+            if seats[code] < 0 or seats[code] > drawable[code]:
+                raise ValueError(f"Quota of {seats[code]} for {group} exceeds its {drawable[code]} customers with Chances")
+
+        keys = draw_keys(weights, seed)
+        order = np.lexsort((keys, codes))
+        # Position of every row within its group, in draw order
+        starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+        rank_in_group = np.arange(len(df)) - starts[codes[order]]
+        winner = np.zeros(len(df), dtype=bool)
+        winner[order[rank_in_group < seats[codes[order]]]] = True
+
+        seat_order = np.lexsort((np.arange(len(df)), -weights, np.where(winner, priority[codes], 0), ~winner))
+        df = df.iloc[seat_order].copy()
+        df['Winner'] = winner[seat_order]
+        df['Seat'] = range(1, len(df) + 1)
+
+        logging.info(f"Number of winners: {int(winner.sum())}")
+        return df
+    except Exception as e:
+        traceback.print_exc()
+        logging.error(f"Failed to generate stratified tickets: {str(e)}")
+        raise ValueError(f"Failed to generate stratified tickets: {str(e)}")
+
+def joint_draw(events, win_limit=1, seed=None):
+    """ draws several lotteries together so nobody wins more than win_limit of them. events is a
+    list of (df, num_tickets) in priority order. Each event is drawn with its own seeded keys and
+    walked in draw order, skipping customers who already reached the limit in an earlier event.
+    Returns the drawn DataFrames in the same order.
+    """
+    try:
+        if seed is None:
+            seed = new_seed()
+        logging.info(f"Joint draw of {len(events)} lotteries, win limit: {win_limit}, seed: {seed}")
+        # One hashed CustomerNumber index across every list, wins are counted per customer code
+        codes, uniques = pd.factorize(pd.concat([df['CustomerNumber'] for df, _ in events], ignore_index=True))
+        bounds = np.cumsum([0] + [len(df) for df, _ in events])
+        wins = np.zeros(len(uniques), dtype=np.int64)
+        results = []
+        for event, (df, num_tickets) in enumerate(events):
+            if num_tickets <= 0 or num_tickets > len(df):
+                raise ValueError(f"Number of tickets for lottery {event + 1} must be between 1 and {len(df)}")
+            event_codes = codes[bounds[event]:bounds[event + 1]]
+            event_seed = int(np.random.SeedSequence([seed, event]).generate_state(1, np.uint64)[0])
+            weights = df['Chances'].to_numpy(dtype=np.float64)
+            check_weights(weights)
+            keys = draw_keys(weights, event_seed)
+            drawable = np.count_nonzero(weights > 0)
+            # Only look as deep into the draw order as conflicts require, doubling when needed
+            depth = min(2 * num_tickets, drawable)
+            while True:
+                order = top_k(keys, depth)[0]
+                order = order[wins[event_codes[order]] < win_limit]
+                # A customer listed twice in one lottery still counts once
+                _, first = np.unique(event_codes[order], return_index=True)
+                order = order[np.sort(first)]
+                if len(order) >= num_tickets or depth == drawable:
+                    break
+                depth = min(2 * depth, drawable)
+            order = order[:num_tickets]
+            if len(order) < num_tickets:
+                logging.warning(f"Lottery {event + 1}: only {len(order)} of {num_tickets} tickets could be given out")
+            wins[event_codes[order]] += 1
+            results.append(apply_draw(df, order, True))
+            logging.info(f"Lottery {event + 1}: {len(order)} winners")
+        return results
+    except Exception as e:
+        traceback.print_exc()
+        logging.error(f"Failed to run joint draw: {str(e)}")
+        raise ValueError(f"Failed to run joint draw: {str(e)}")
+
 def save_to_file(df, file_name, file_type):
     try:
         if file_type == 'excel':
             with pd.ExcelWriter(file_name) as writer:
                 df.to_excel(writer, index=False)
         elif file_type == 'csv':
-            df.to_csv(file_name, index=False)
+            # Compressed the same way as the input, going by the extension. A zip archive gets a
+            # single CSV member, also when the list was read from several members.
+            compression = 'infer'
+            if file_name.endswith('.zip'):
+                compression = {'method': 'zip', 'archive_name': os.path.basename(file_name)[:-4] + '.csv'}
+            df.to_csv(file_name, index=False, compression=compression)
+        elif file_type == 'sqlite':
+            save_sqlite(df, file_name)
         else:
             raise ValueError("Unsupported file format")
         
@@ -82,22 +524,355 @@ def save_to_file(df, file_name, file_type):
         logging.error(f"Failed to save file: {str(e)}")
         raise ValueError(f"Failed to save file: {str(e)}")
 
-if __name__ == "__main__":
+# Compact on-disk seat index: one record per customer, sorted by CustomerNumber. It is memory
+# mapped on lookup, so a binary search only touches a few pages of even a very large index.
+SEAT_INDEX_DTYPE = np.dtype([('customer', '<i8'), ('seat', '<i4'), ('winner', 'i1')])
+WINNER_CODES = {True: 1, False: 0, "?": -1}
+WINNER_VALUES = {code: value for value, code in WINNER_CODES.items()}
+
+def seat_index_path(file_name):
+    return f"{file_name}.seats.npy"
+
+def build_seat_index(df):
+    """ returns a dict CustomerNumber -> (Seat, Winner) for lookups after a draw
+    """
+    return dict(zip(df['CustomerNumber'].tolist(), zip(df['Seat'].tolist(), df['Winner'].tolist())))
+
+def save_seat_index(df, file_name):
+    try:
+        index = np.empty(len(df), dtype=SEAT_INDEX_DTYPE)
+        index['customer'] = df['CustomerNumber'].to_numpy()
+        index['seat'] = df['Seat'].to_numpy()
+        index['winner'] = df['Winner'].map(WINNER_CODES).to_numpy()
+        index.sort(order='customer')
+        np.save(file_name, index)
+        logging.info(f"Saved seat index: {file_name}")
+    except Exception as e:
+        logging.error(f"Failed to save seat index: {str(e)}")
+        raise ValueError(f"Failed to save seat index: {str(e)}")
+
+def lookup_seats(file_name, customers):
+    """ returns {CustomerNumber: (Seat, Winner) or None} from a saved seat index
+    """
+    try:
+        index = np.load(file_name, mmap_mode='r')
+        keys = index['customer']
+        customers = np.asarray(customers, dtype=np.int64)
+        found = np.searchsorted(keys, customers)
+        results = {}
+        for customer, position in zip(customers.tolist(), found.tolist()):
+            if position < len(keys) and keys[position] == customer:
+                record = index[position]
+                results[customer] = (int(record['seat']), WINNER_VALUES[int(record['winner'])])
+            else:
+                results[customer] = None
+        return results
+    except Exception as e:
+        logging.error(f"Failed to look up seats: {str(e)}")
+        raise ValueError(f"Failed to look up seats: {str(e)}")
+
+def ranking_path(file_name):
+    return f"{file_name}.order.npz"
+
+def check_unique_customers(df):
+    # Rankings and histories name rows by CustomerNumber, which only works one row per customer
+    duplicated = df['CustomerNumber'][df['CustomerNumber'].duplicated()]
+    if len(duplicated):
+        raise ValueError(f"CustomerNumber {duplicated.iloc[0]} is listed more than once, "
+                         f"merge duplicate customers before drawing a ranking")
+
+def draw_ranking(df, seed, workers=1):
+    """ draws every customer with non-zero Chances once and returns their CustomerNumbers in draw
+    order. The winners for any number of tickets k are the first k, so answers for different k
+    never contradict each other.
+    """
+    check_unique_customers(df)
+    weights = df['Chances'].to_numpy(dtype=np.float64)
+    # The key engine's top k is always a prefix of its full ordering
+    order = draw_order(weights, np.count_nonzero(weights), seed, workers, engine="keys")
+    return df['CustomerNumber'].to_numpy(dtype=np.int64)[order]
+
+def list_digest(df):
+    # Digest of every (CustomerNumber, Chances) pair, independent of the order of the rows
+    customers = df['CustomerNumber'].to_numpy(dtype=np.int64)
+    chances = df['Chances'].to_numpy(dtype=np.float64)
+    order = np.lexsort((chances, customers))
+    digest = hashlib.blake2b(customers[order].tobytes(), digest_size=16)
+    digest.update(chances[order].tobytes())
+    return digest.hexdigest()
+
+def save_ranking(file_name, customers, seed, df):
+    # The list's length and digest are stored too, so a ranking is never applied to an edited list
+    np.savez(file_name, seed=str(seed), customers=customers, rows=len(df), digest=list_digest(df))
+    logging.info(f"Saved draw ranking with seed {seed}: {file_name}")
+
+def load_ranking(file_name, df):
+    """ returns (seed, customers) of a saved ranking, if it was drawn from this version of df
+    """
+    with np.load(file_name) as data:
+        if 'digest' not in data.files or int(data['rows']) != len(df) or str(data['digest']) != list_digest(df):
+            raise ValueError("The saved draw ranking was made for a different version of this list")
+        return int(data['seed']), data['customers']
+
+def ranking_positions(df, customers):
+    """ returns the row positions of the ranked customers in df, so the draw for k tickets is
+    apply_draw(df, positions[:k], True)
+    """
+    check_unique_customers(df)
+    positions = pd.Index(df['CustomerNumber']).get_indexer(customers)
+    if (positions < 0).any():
+        raise ValueError("The draw ranking does not belong to this list")
+    return positions
+
+# Past winners index: one record per customer who won before, with how many times, sorted by
+# CustomerNumber and memory mapped when used, so checking a whole list is one vectorized search.
+WINNER_INDEX_DTYPE = np.dtype([('customer', '<i8'), ('wins', '<i4')])
+
+def build_winner_index(file_names, index_name, existing=None):
+    """ counts the winners (Winner True) of earlier result files and saves them as a past winners
+    index, added to the counts of an existing index if one is given
+    """
+    try:
+        customers = []
+        for file_name in file_names:
+            df, _ = open_file(file_name)
+            customers.append(df.loc[df['Winner'] == True, 'CustomerNumber'].to_numpy(dtype=np.int64))
+        if existing is not None:
+            old = np.load(existing)
+            customers.append(np.repeat(old['customer'], old['wins']))
+        unique, counts = np.unique(np.concatenate(customers) if customers else np.zeros(0, np.int64),
+                                   return_counts=True)
+        index = np.empty(len(unique), dtype=WINNER_INDEX_DTYPE)
+        index['customer'] = unique
+        index['wins'] = counts
+        np.save(index_name, index)
+        logging.info(f"Saved past winners index of {len(index)} customers: {index_name}")
+        return index
+    except Exception as e:
+        logging.error(f"Failed to build past winners index: {str(e)}")
+        raise ValueError(f"Failed to build past winners index: {str(e)}")
+
+def dampened_weights(df, index_name, decay):
+    """ returns Chances scaled by decay for every earlier win of the customer in the index
+    """
+    try:
+        if not 0 <= decay <= 1:
+            raise ValueError("Decay must be between 0 and 1")
+        index = np.load(index_name, mmap_mode='r')
+        keys = index['customer']
+        customers = df['CustomerNumber'].to_numpy(dtype=np.int64)
+        found = np.minimum(np.searchsorted(keys, customers), max(len(keys) - 1, 0))
+        wins = np.zeros(len(df), dtype=np.int64)
+        if len(keys):
+            hit = keys[found] == customers
+            wins[hit] = index['wins'][found[hit]]
+        logging.info(f"Dampening Chances of {np.count_nonzero(wins)} past winners by {decay} per win")
+        return df['Chances'].to_numpy(dtype=np.float64) * decay ** wins
+    except Exception as e:
+        logging.error(f"Failed to dampen Chances: {str(e)}")
+        raise ValueError(f"Failed to dampen Chances: {str(e)}")
+
+def run_interactive(args):
     try:
         file_path = input("Enter the path of the Excel or CSV file: ")
         df, file_type = open_file(file_path)
 
-        num_tickets_input = input("Enter the number of tickets to generate (or press Enter to use all): ").strip()
-        num_tickets = len(df) 
-        num_given = False
-        if not num_tickets_input == "":
-            num_tickets = int(num_tickets_input)
-            num_given = True
-        
-        df = generate_tickets(df, num_tickets, num_given)
+        weights = None
+        if args.dampen:
+            weights = dampened_weights(df, args.dampen, args.decay)
+        if args.prizes is not None:
+            df = generate_prizes(df, args.prizes, seed=args.seed, weights=weights)
+        else:
+            num_tickets_input = input("Enter the number of tickets to generate (or press Enter to use all): ").strip()
+            num_tickets = len(df) 
+            num_given = False
+            if not num_tickets_input == "":
+                num_tickets = int(num_tickets_input)
+                num_given = True
+            
+            df = generate_tickets(df, num_tickets, num_given, seed=args.seed, workers=args.workers, weights=weights)
         
         # output_file = input("Enter the output file name: ")
         save_to_file(df, file_path, file_type)
+        if args.prizes is None:
+            save_seat_index(df, seat_index_path(file_path))
+        print("Done!")
+    except Exception as e:
+        print(f"Error: {str(e)}")
+
+def run_lookup(args):
+    try:
+        index_path = args.index if args.index.endswith('.npy') else seat_index_path(args.index)
+        for customer, found in lookup_seats(index_path, args.customers).items():
+            if found is None:
+                print(f"{customer}: not found")
+            else:
+                print(f"{customer}: seat {found[0]}, winner {found[1]}")
+    except Exception as e:
+        print(f"Error: {str(e)}")
+
+def run_cards(args):
+    try:
+        # matplotlib is only needed here, keep it out of the startup of every other command
+        from cards import render_cards
+        df, _ = open_file(args.file)
+        out_dir = args.out or os.path.splitext(args.file)[0] + "_cards"
+        files = render_cards(df, out_dir, args.per_page, args.pages_per_file, args.workers)
+        print(f"Wrote {len(files)} files to {out_dir}")
+    except Exception as e:
+        print(f"Error: {str(e)}")
+
+def run_watch(args):
+    try:
+        from watch import watch_folder
+        print(f"Watching {args.folder}, press Ctrl+C to stop")
+        watch_folder(args.folder, args.out, args.tickets, args.workers, args.settle, args.poll)
+    except KeyboardInterrupt:
+        print("Stopped")
+    except Exception as e:
+        print(f"Error: {str(e)}")
+
+def run_sqlite(args):
+    try:
+        seed = new_seed() if args.seed is None else args.seed
+        order = draw_sqlite(args.database, args.tickets, args.tickets is not None, seed, args.table)
+        save_seat_index(read_results(args.database, args.table), seat_index_path(args.database))
+        print(f"Drew {len(order)} winners, seed: {seed}")
+    except Exception as e:
+        logging.error(f"Failed to draw in SQLite: {str(e)}")
+        print(f"Error: {str(e)}")
+
+def run_joint(args):
+    try:
+        events = []
+        for spec in args.lotteries:
+            # Split on the last colon, Windows paths contain one too
+            file_path, num_tickets = spec.rsplit(':', 1)
+            df, file_type = open_file(file_path)
+            events.append((file_path, file_type, df, int(num_tickets)))
+        results = joint_draw([(df, num_tickets) for _, _, df, num_tickets in events], args.limit, args.seed)
+        for (file_path, file_type, _, _), df in zip(events, results):
+            save_to_file(df, file_path, file_type)
+            save_seat_index(df, seat_index_path(file_path))
         print("Done!")
     except Exception as e:
         print(f"Error: {str(e)}")
+
+def run_stratified(args):
+    try:
+        df, file_type = open_file(args.file)
+        quotas = dict(quota.rsplit('=', 1) for quota in args.quotas)
+        df = generate_stratified(df, args.column, quotas, seed=args.seed)
+        save_to_file(df, args.file, file_type)
+        save_seat_index(df, seat_index_path(args.file))
+        print("Done!")
+    except Exception as e:
+        print(f"Error: {str(e)}")
+
+def run_past_winners(args):
+    try:
+        index = build_winner_index(args.files, args.index, args.add_to)
+        print(f"Indexed {len(index)} past winners")
+    except Exception as e:
+        print(f"Error: {str(e)}")
+
+def run_whatif(args):
+    try:
+        df, file_type = open_file(args.file)
+        path = ranking_path(args.file)
+        if os.path.exists(path) and not args.redraw:
+            try:
+                seed, customers = load_ranking(path, df)
+            except ValueError as e:
+                raise ValueError(f"{str(e)}, use --redraw to replace it")
+        else:
+            seed = new_seed() if args.seed is None else args.seed
+            customers = draw_ranking(df, seed, args.workers)
+            save_ranking(path, customers, seed, df)
+        print(f"Ranking of {len(customers)} customers, seed: {seed}")
+        positions = ranking_positions(df, customers)
+        for k in sorted(args.tickets) + ([] if args.apply is None else [args.apply]):
+            if not 0 < k <= len(customers):
+                raise ValueError(f"Number of tickets must be between 1 and {len(customers)}")
+        for k in sorted(args.tickets):
+            # The winners for k are the first k customers of the ranking, summarized by Chances
+            values, counts = np.unique(df['Chances'].to_numpy()[positions[:k]], return_counts=True)
+            breakdown = ", ".join(f"{count} with Chances {value}" for value, count in zip(values[::-1], counts[::-1]))
+            print(f"{k} tickets: {breakdown}")
+        if args.apply is not None:
+            df = apply_draw(df, positions[:args.apply], True)
+            save_to_file(df, args.file, file_type)
+            save_seat_index(df, seat_index_path(args.file))
+            print(f"Saved the winners for {args.apply} tickets")
+    except Exception as e:
+        print(f"Error: {str(e)}")
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    parser = argparse.ArgumentParser(description="USCTO seat generator")
+    parser.add_argument("--seed", type=int, help="Seed for the draw (a fresh one is logged when omitted)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="Processes used to draw from lists larger than one block")
+    parser.add_argument("--prizes", type=int,
+                        help="Run a prize raffle of this many draws, where a customer can win several times")
+    parser.add_argument("--dampen", metavar="INDEX", help="Past winners index that lowers the Chances of repeat winners")
+    parser.add_argument("--decay", type=float, default=0.5,
+                        help="Factor applied to Chances for every past win in the --dampen index")
+    parser.set_defaults(run=run_interactive)
+    subparsers = parser.add_subparsers(dest="command")
+
+    lookup_parser = subparsers.add_parser("lookup", help="Find the seats of customers after a draw")
+    lookup_parser.add_argument("index", help="Seat index (.seats.npy) or the drawn Excel/CSV file")
+    lookup_parser.add_argument("customers", type=int, nargs="+", help="Customer numbers to look up")
+    lookup_parser.set_defaults(run=run_lookup)
+
+    cards_parser = subparsers.add_parser("cards", help="Render printable seat cards for the winners of a drawn file")
+    cards_parser.add_argument("file", help="Drawn Excel/CSV file")
+    cards_parser.add_argument("--out", help="Output folder (default: FILE_cards)")
+    cards_parser.add_argument("--per-page", type=int, default=10, help="Seat cards per page")
+    cards_parser.add_argument("--pages-per-file", type=int, default=50, help="Pages per PDF file, one file per worker task")
+    cards_parser.set_defaults(run=run_cards)
+
+    watch_parser = subparsers.add_parser("watch", help="Draw every list dropped into a folder")
+    watch_parser.add_argument("folder", help="Folder to watch")
+    watch_parser.add_argument("out", help="Folder for results, status records and processed inputs")
+    watch_parser.add_argument("--tickets", type=int, help="Number of tickets per list (default: use all)")
+    watch_parser.add_argument("--settle", type=float, default=2.0,
+                              help="Seconds a file must stay unchanged before it is picked up")
+    watch_parser.add_argument("--poll", type=float, default=1.0, help="Seconds between folder checks")
+    watch_parser.set_defaults(run=run_watch)
+
+    sqlite_parser = subparsers.add_parser("sqlite", help="Draw inside a SQLite database without loading the list")
+    sqlite_parser.add_argument("database", help="SQLite database file")
+    sqlite_parser.add_argument("--table", default="customers", help="Table with CustomerNumber and Chances columns")
+    sqlite_parser.add_argument("--tickets", type=int, help="Number of tickets (default: use all)")
+    sqlite_parser.set_defaults(run=run_sqlite)
+
+    joint_parser = subparsers.add_parser("joint", help="Draw several lotteries so a customer wins at most --limit of them")
+    joint_parser.add_argument("lotteries", nargs="+", metavar="FILE:TICKETS",
+                              help="Lists and their number of tickets, highest priority first")
+    joint_parser.add_argument("--limit", type=int, default=1, help="Most lotteries one customer can win")
+    joint_parser.set_defaults(run=run_joint)
+
+    stratified_parser = subparsers.add_parser("stratified", help="Draw a fixed quota of winners from every group")
+    stratified_parser.add_argument("file", help="Excel/CSV file")
+    stratified_parser.add_argument("column", help="Column to group customers by, e.g. a membership tier")
+    stratified_parser.add_argument("quotas", nargs="+", metavar="GROUP=QUOTA",
+                                   help="Seats per group, as a number or a percentage of the group (Gold=50 Silver=20%%)")
+    stratified_parser.set_defaults(run=run_stratified)
+
+    past_parser = subparsers.add_parser("past-winners", help="Build a past winners index from earlier result files")
+    past_parser.add_argument("index", help="Index file to write (.npy)")
+    past_parser.add_argument("files", nargs="+", help="Drawn Excel/CSV files of earlier seasons")
+    past_parser.add_argument("--add-to", metavar="INDEX", help="Existing index whose counts are added")
+    past_parser.set_defaults(run=run_past_winners)
+
+    whatif_parser = subparsers.add_parser("whatif", help="Draw once and see who gets in for any number of tickets")
+    whatif_parser.add_argument("file", help="Excel/CSV file")
+    whatif_parser.add_argument("tickets", type=int, nargs="*", help="Numbers of tickets to compare")
+    whatif_parser.add_argument("--apply", type=int, metavar="TICKETS", help="Save the winners for this number of tickets")
+    whatif_parser.add_argument("--redraw", action="store_true", help="Replace the saved ranking with a new draw")
+    whatif_parser.set_defaults(run=run_whatif)
+
+    args = parser.parse_args()
+    args.run(args)
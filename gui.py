@@ -4,6 +4,10 @@ import pandas as pd  # Import pandas library for data handling
 from pandastable import Table, TableModel  # Import PandasTable for displaying data in Tkinter
 import numpy as np  # Import NumPy for numerical operations
 import logging  # Import logging for tracking events and errors
+import os
+from cli import CSV_EXTENSIONS, read_csv_file, apply_draw, draw_order, new_seed, build_seat_index, save_seat_index, save_to_file, seat_index_path  # Shared draw engine
+from cli import draw_ranking, load_ranking, ranking_path, ranking_positions, save_ranking  # Draw once, answer any number of tickets
+from history import Draw, DrawHistory, diff_draws  # Compact draw snapshots for undo/redo/compare
 
 # Configure logging to save logs in 'log.csv' file with timestamp, log level, and messages
 logging.basicConfig(filename='log.csv', level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -18,6 +22,11 @@ class ExcelViewerApp:
         self.df = None  # Variable to store DataFrame (Excel/CSV data)
         self.file_name = None  # Variable to store the name of the opened file
         self.file_type = None  # Variable to store the type of the opened file (Excel or CSV)
+        self.base_df = None  # The list as loaded, every draw is applied to it
+        self.list_key = None  # Names the loaded list in the draw engine's table cache
+        self.history = DrawHistory()  # Draws made on the loaded list
+        self.seat_index = {}  # CustomerNumber -> (Seat, Winner) of the draw on screen
+        self.ranking = None  # (seed, row positions in draw order) behind the what-if slider
 
         # Initialize GUI widgets (textboxes, buttons, frames, menus)
         self.setup_widgets()
@@ -32,13 +41,29 @@ class ExcelViewerApp:
         self.button = tk.Button(self.root, text="Pick Random", command=self.generate_tickets)
         self.button.grid(row=0, column=1, padx=5, pady=5)
 
+        # Create a search box to find the seat of a customer number
+        self.search = tk.Entry(self.root, width=20)
+        self.search.grid(row=0, column=2, padx=5, pady=5)
+        self.search.bind("<Return>", lambda event: self.find_seat())
+        self.search_button = tk.Button(self.root, text="Find Seat", command=self.find_seat)
+        self.search_button.grid(row=0, column=3, padx=5, pady=5)
+        self.search_result = tk.Label(self.root, width=30, anchor="w")
+        self.search_result.grid(row=0, column=4, padx=5, pady=5)
+
         # Create a separator line
         self.line = tk.Frame(self.root, height=1, width=400, bg="grey80", relief='groove')
-        self.line.grid(row=1, columnspan=2, sticky="ew")
+        self.line.grid(row=1, columnspan=5, sticky="ew")
 
         # Create a frame for displaying the table
         self.frame = tk.Frame(self.root)
-        self.frame.grid(row=2, columnspan=2, sticky="nsew")
+        self.frame.grid(row=2, columnspan=5, sticky="nsew")
+
+        # Create a slider that shows the winners for any number of tickets from a single draw
+        self.slider = tk.Scale(self.root, from_=1, to=1, orient=tk.HORIZONTAL, label="What if: number of tickets",
+                               command=self.preview_tickets, state=tk.DISABLED)
+        self.slider.grid(row=3, column=0, columnspan=4, sticky="ew", padx=5)
+        self.keep_button = tk.Button(self.root, text="Keep", command=self.keep_preview, state=tk.DISABLED)
+        self.keep_button.grid(row=3, column=4, padx=5, pady=5)
 
         # Create a menu bar
         menubar = tk.Menu(self.root)
@@ -48,9 +73,24 @@ class ExcelViewerApp:
         file_menu = tk.Menu(menubar, tearoff=0)
         menubar.add_cascade(label="File", menu=file_menu)
         file_menu.add_command(label="Open File", command=self.open_file)
+        file_menu.add_command(label="Save Draw", command=self.save_draw, accelerator="Ctrl+S")
+        file_menu.add_command(label="Save Draw History", command=self.save_history)
+        file_menu.add_command(label="Load Draw History", command=self.load_history)
         file_menu.add_separator()
         file_menu.add_command(label="Exit", command=self.root.quit)
 
+        # Create a Draw menu to step through and compare earlier draws
+        draw_menu = tk.Menu(menubar, tearoff=0)
+        menubar.add_cascade(label="Draw", menu=draw_menu)
+        draw_menu.add_command(label="Undo", command=self.undo_draw, accelerator="Ctrl+Z")
+        draw_menu.add_command(label="Redo", command=self.redo_draw, accelerator="Ctrl+Y")
+        draw_menu.add_command(label="Compare with Previous", command=self.compare_draws)
+        draw_menu.add_separator()
+        draw_menu.add_command(label="New What-if Ranking", command=self.start_whatif)
+        self.root.bind("<Control-z>", lambda event: self.undo_draw())
+        self.root.bind("<Control-y>", lambda event: self.redo_draw())
+        self.root.bind("<Control-s>", lambda event: self.save_draw())
+
         # Initialize PandasTable to display data
         self.table = Table(self.frame, showtoolbar=True, showstatusbar=True)
         self.table.show()
@@ -58,7 +98,7 @@ class ExcelViewerApp:
     def open_file(self):
         try:
             # Open a file dialog to select Excel or CSV file
-            file_path = filedialog.askopenfilename(filetypes=[("Excel Files", "*.xlsx *.xls"), ("CSV Files", "*.csv")])
+            file_path = filedialog.askopenfilename(filetypes=[("Excel Files", "*.xlsx *.xls"), ("CSV Files", "*.csv *.csv.gz *.csv.bz2 *.csv.xz *.csv.zst *.zip")])
             if file_path:
                 # Load data from the selected file and display it in the table
                 self.load_data(file_path)
@@ -73,14 +113,20 @@ class ExcelViewerApp:
             if file_path.endswith(('.xls', '.xlsx')):
                 self.file_type = 'excel'
                 self.df = pd.read_excel(file_path)
-            elif file_path.endswith('.csv'):
+            elif file_path.endswith(CSV_EXTENSIONS):
                 self.file_type = 'csv'
-                self.df = pd.read_csv(file_path)
+                self.df = read_csv_file(file_path)  # Compressed CSV is read without unpacking it
             else:
                 raise ValueError("Unsupported file format")
             
             # Sort data by the second column (index 1) in descending order
             self.df = self.df.sort_values(by=self.df.columns[1], ascending=False)
+            # Keep the loaded list so draws can be restored without reading the file again
+            self.base_df = self.df
+            self.list_key = object()
+            self.history = DrawHistory()
+            self.seat_index = {}
+            self.load_whatif(file_path)
             # Update the PandasTable with the loaded data
             self.table.updateModel(TableModel(self.df))
             # Set the file_open flag to indicate that a file is successfully opened
@@ -100,12 +146,15 @@ class ExcelViewerApp:
                 return
             
             num_entered, num_tickets = self.get_num_tickets()
-            winners = self.get_random_winners(num_tickets, num_entered)
-            self.assign_seats(winners, num_entered)
+            seed = new_seed()
+            order = draw_order(self.base_df['Chances'].to_numpy(), num_tickets, seed, cache_key=self.list_key)
+            draw = Draw(seed, num_tickets, num_entered, order.astype(np.int32))
+            self.history.push(draw)
+            self.show_draw(draw)
             self.save_file()  # Save the generated data to a file
 
             # Log information about the generated winners and number of tickets
-            logging.info(f"Generated winners, num given: {num_tickets}")
+            logging.info(f"Generated winners, num given: {num_tickets}, seed: {seed}")
             num_winners = self.df['Winner'].value_counts()
             logging.info(f"Number of winners: {num_winners.to_string(header=False)}")
         except Exception as e:
@@ -124,48 +173,151 @@ class ExcelViewerApp:
                 raise ValueError(f"Number of tickets must be less than {len(self.df)}")  # Raise error if input exceeds total records
             return True, int(num_tickets)  # Return True (flag) and entered number of tickets
 
-    def get_random_winners(self, num_tickets, num_entered):
-        # Calculate weights based on 'Chances' column to pick random winners
-        weights = self.df['Chances'] / self.df['Chances'].sum()
-        if num_entered:
-            # Randomly select winners' indices based on weights
-            winners_indices = np.random.choice(self.df.index, num_tickets, p=weights, replace=False)
-            # Mark winners in the 'Winner' column
-            self.df['Winner'] = False
-            self.df.loc[winners_indices, 'Winner'] = True
-        else:
-            # Randomly select CustomerNumbers as winners without actual indices
-            winners_indices = np.random.choice(self.df['CustomerNumber'], num_tickets, p=weights, replace=False)
-            # Mark winners as question marks in the 'Winner' column
-            self.df['Winner'] = "?"
-        return winners_indices
-
-    def assign_seats(self, winners_indices, num_entered):
-        # Sort DataFrame by 'Winner' and 'Chances' columns in descending order
-        self.df = self.df.sort_values(by=['Winner', 'Chances'], ascending=False)
-        if num_entered:
-            # Assign seat numbers based on the sorted DataFrame
-            self.df['Seat'] = range(1, len(self.df) + 1)
-            actual_indices = winners_indices  # Use winners' indices as actual indices
-        else:
-            # Assign seat numbers based on winners' indices and update the PandasTable
-            for i in range(len(self.df)):
-                self.df.loc[self.df['CustomerNumber'] == winners_indices[i], 'Seat'] = i + 1
-            actual_indices = self.df['CustomerNumber'].isin(winners_indices)
-        self.table.updateModel(TableModel(self.df.loc[actual_indices]))  # Update PandasTable with actual indices
+    def show_draw(self, draw):
+        # Rebuild the result of a draw from the loaded list and show its winners
+        self.df = apply_draw(self.base_df, draw.order, draw.num_entered)
+        self.seat_index = build_seat_index(self.df)
+        # Winners come first, in the 'use all' case every row is drawn
+        self.table.updateModel(TableModel(self.df.head(draw.num_tickets)))
         self.table.redraw()  # Redraw the table to reflect the changes
 
-    def save_file(self):
-        # Save the DataFrame to a file based on the file type (Excel or CSV)
-        if self.file_type == 'excel':
-            with pd.ExcelWriter(self.file_name) as writer:
-                self.df.to_excel(writer, index=False)  # Save DataFrame to Excel file without index
-                logging.info(f"Saved to Excel file: {self.file_name}")
-        elif self.file_type == 'csv':
-            self.df.to_csv(self.file_name, index=False)  # Save DataFrame to CSV file without index
-            logging.info(f"Saved to CSV file: {self.file_name}")
+    def find_seat(self):
+        # Look up the customer number in the seat index of the draw on screen
+        text = self.search.get().strip()
+        try:
+            found = self.seat_index.get(int(text))
+        except ValueError:
+            found = None
+        if found is None:
+            self.search_result.config(text=f"{text}: not found")
         else:
-            raise ValueError("Unsupported file format")  # Raise error for unsupported file type
+            self.search_result.config(text=f"{text}: seat {found[0]}, winner {found[1]}")
+
+    def load_whatif(self, file_path):
+        # Pick up the ranking saved for this file by an earlier what-if, from the GUI or the CLI
+        self.ranking = None
+        self.slider.config(state=tk.DISABLED)
+        self.keep_button.config(state=tk.DISABLED)
+        if os.path.exists(ranking_path(file_path)):
+            try:
+                self.set_ranking(*load_ranking(ranking_path(file_path), self.base_df))
+            except Exception as e:
+                logging.error(f"Failed to load draw ranking: {str(e)}")
+
+    def start_whatif(self):
+        try:
+            if not self.file_open:
+                raise ValueError("Please open a file first")
+            seed = new_seed()
+            customers = draw_ranking(self.base_df, seed)
+            save_ranking(ranking_path(self.file_name), customers, seed, self.base_df)
+            self.set_ranking(seed, customers)
+        except Exception as e:
+            self.show_error(f"Failed to draw ranking: {str(e)}")
+            logging.error(f"Failed to draw ranking: {str(e)}")
+
+    def set_ranking(self, seed, customers):
+        self.ranking = (seed, ranking_positions(self.base_df, customers).astype(np.int32))
+        self.slider.config(state=tk.NORMAL, to=len(customers))
+        self.keep_button.config(state=tk.NORMAL)
+
+    def preview_tickets(self, value):
+        # The winners for k tickets are the first k of the ranking, so this only touches k rows
+        if self.ranking is None:
+            return
+        winners = self.base_df.iloc[self.ranking[1][:int(value)]].drop(columns=['Winner', 'Seat'], errors='ignore')
+        self.table.updateModel(TableModel(winners.sort_values(by='Chances', ascending=False, kind='stable')))
+        self.table.redraw()
+
+    def keep_preview(self):
+        try:
+            seed, positions = self.ranking
+            num_tickets = int(self.slider.get())
+            draw = Draw(seed, num_tickets, True, positions[:num_tickets])
+            self.history.push(draw)
+            self.show_draw(draw)
+            self.save_file()
+            logging.info(f"Kept what-if winners, num given: {num_tickets}, seed: {seed}")
+        except Exception as e:
+            self.show_error(f"Failed to keep winners: {str(e)}")
+            logging.error(f"Failed to keep winners: {str(e)}")
+
+    def undo_draw(self):
+        self.step_history(self.history.undo)
+
+    def redo_draw(self):
+        self.step_history(self.history.redo)
+
+    def step_history(self, step):
+        try:
+            draw = step()
+            # Restored in memory only, File > Save Draw writes it to the file
+            self.show_draw(draw)
+            logging.info(f"Restored draw with seed: {draw.seed}")
+        except Exception as e:
+            self.show_error(f"Failed to restore draw: {str(e)}")
+            logging.error(f"Failed to restore draw: {str(e)}")
+
+    def compare_draws(self):
+        try:
+            current, previous = self.history.current(), self.history.previous()
+            if current is None or previous is None:
+                raise ValueError("At least two draws are needed to compare")
+            rows, ranks_previous, ranks_current = diff_draws(previous, current, len(self.base_df))
+            changes = self.base_df.iloc[rows][['CustomerNumber', 'Chances']].copy()
+            # Draw position in each draw, 0 if the customer was not drawn
+            changes['Previous'] = ranks_previous
+            changes['Current'] = ranks_current
+            window = tk.Toplevel(self.root)
+            window.title(f"{len(changes)} customers changed between the last two draws")
+            frame = tk.Frame(window)
+            frame.pack(fill="both", expand=True)
+            table = Table(frame, dataframe=changes, showstatusbar=True)
+            table.show()
+        except Exception as e:
+            self.show_error(f"Failed to compare draws: {str(e)}")
+            logging.error(f"Failed to compare draws: {str(e)}")
+
+    def save_history(self):
+        try:
+            if not self.file_open:
+                raise ValueError("Please open a file first")
+            file_path = filedialog.asksaveasfilename(defaultextension=".npz", filetypes=[("Draw History", "*.npz")])
+            if file_path:
+                self.history.save(file_path, self.base_df)
+                logging.info(f"Saved draw history: {file_path}")
+        except Exception as e:
+            self.show_error(f"Failed to save draw history: {str(e)}")
+            logging.error(f"Failed to save draw history: {str(e)}")
+
+    def load_history(self):
+        try:
+            if not self.file_open:
+                raise ValueError("Please open a file first")
+            file_path = filedialog.askopenfilename(filetypes=[("Draw History", "*.npz")])
+            if file_path:
+                self.history.load(file_path, self.base_df)
+                if self.history.current() is not None:
+                    self.show_draw(self.history.current())
+                logging.info(f"Loaded draw history: {file_path}")
+        except Exception as e:
+            self.show_error(f"Failed to load draw history: {str(e)}")
+            logging.error(f"Failed to load draw history: {str(e)}")
+
+    def save_draw(self):
+        try:
+            if self.history.current() is None:
+                raise ValueError("Please pick a draw first")
+            self.save_file()
+        except Exception as e:
+            self.show_error(f"Failed to save draw: {str(e)}")
+            logging.error(f"Failed to save draw: {str(e)}")
+
+    def save_file(self):
+        # Save the seat index next to the file for lookups from the command line
+        save_seat_index(self.df, seat_index_path(self.file_name))
+        # Excel or CSV, compressed the same way as the file that was opened
+        save_to_file(self.df, self.file_name, self.file_type)
 
     def show_error(self, message):
         # Display an error message dialog with the given message
@@ -0,0 +1,99 @@
+from collections import deque, namedtuple
+import numpy as np
+from cli import list_digest, ranking_positions
+
+# A draw is stored as its seed and the drawn row positions (int32, in draw order) into the
+# loaded list, instead of a copy of the DataFrame. cli.apply_draw rebuilds the result from it.
+# Positions only hold for the list as loaded, so saved histories store CustomerNumbers instead.
+Draw = namedtuple('Draw', ['seed', 'num_tickets', 'num_entered', 'order'])
+
+class DrawHistory:
+    def __init__(self, capacity=100):
+        # Ring buffer of draws, the oldest draw is dropped once capacity is reached
+        self.draws = deque(maxlen=capacity)
+        self.position = -1  # Index of the draw currently shown
+
+    def push(self, draw):
+        # A new draw discards anything that could have been redone
+        while len(self.draws) > self.position + 1:
+            self.draws.pop()
+        self.draws.append(draw)
+        self.position = len(self.draws) - 1
+
+    def current(self):
+        return self.draws[self.position] if self.position >= 0 else None
+
+    def previous(self):
+        return self.draws[self.position - 1] if self.position > 0 else None
+
+    def can_undo(self):
+        return self.position > 0
+
+    def can_redo(self):
+        return self.position < len(self.draws) - 1
+
+    def undo(self):
+        if not self.can_undo():
+            raise ValueError("No earlier draw to go back to")
+        self.position -= 1
+        return self.current()
+
+    def redo(self):
+        if not self.can_redo():
+            raise ValueError("No later draw to go forward to")
+        self.position += 1
+        return self.current()
+
+    def save(self, file_name, df):
+        """ saves the draws made on df. Rows are stored as CustomerNumbers, as a saved result file is
+        re-sorted when it is opened again, along with the list's digest to recognise it by.
+        """
+        # All orders go into one array with offsets, so the file stays about as compact as memory
+        orders = [draw.order for draw in self.draws]
+        customers = df['CustomerNumber'].to_numpy(dtype=np.int64)
+        np.savez_compressed(
+            file_name,
+            num_rows=len(df),
+            digest=list_digest(df),
+            position=self.position,
+            seeds=np.array([str(draw.seed) for draw in self.draws]),
+            num_tickets=np.array([draw.num_tickets for draw in self.draws], dtype=np.int64),
+            num_entered=np.array([draw.num_entered for draw in self.draws], dtype=bool),
+            offsets=np.cumsum([0] + [len(order) for order in orders]),
+            customers=customers[np.concatenate(orders)] if orders else np.zeros(0, dtype=np.int64),
+        )
+
+    def load(self, file_name, df):
+        """ loads draws saved by save() and maps them to the row positions of df, which must hold
+        the same customers and Chances in any order
+        """
+        with np.load(file_name) as data:
+            if 'digest' not in data.files or int(data['num_rows']) != len(df) or str(data['digest']) != list_digest(df):
+                raise ValueError("Draw history was saved for a different version of this list")
+            offsets = data['offsets']
+            positions = ranking_positions(df, data['customers']).astype(np.int32)
+            self.draws.clear()
+            for i, seed in enumerate(data['seeds']):
+                order = positions[offsets[i]:offsets[i + 1]]
+                self.draws.append(Draw(int(seed), int(data['num_tickets'][i]), bool(data['num_entered'][i]), order))
+            self.position = min(int(data['position']), len(self.draws) - 1)
+
+def draw_ranks(draw, num_rows):
+    """ returns the draw position (1 based) of every row, 0 for rows that were not drawn
+    """
+    ranks = np.zeros(num_rows, dtype=np.int32)
+    ranks[draw.order] = np.arange(1, len(draw.order) + 1, dtype=np.int32)
+    return ranks
+
+def diff_draws(a, b, num_rows):
+    """ returns (rows, ranks_a, ranks_b) for the rows that were drawn in a different position,
+    or drawn in only one of the two draws
+    """
+    ranks_a = draw_ranks(a, num_rows)
+    ranks_b = draw_ranks(b, num_rows)
+    if a.num_entered and b.num_entered:
+        # Seats of given-count draws follow Chances, only who won matters
+        rows = np.flatnonzero((ranks_a > 0) != (ranks_b > 0))
+    else:
+        rows = np.flatnonzero(ranks_a != ranks_b)
+    return rows, ranks_a[rows], ranks_b[rows]
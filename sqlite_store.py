@@ -0,0 +1,125 @@
+import logging
+import math
+import sqlite3
+import pandas as pd
+
+# File types stored in SQLite, read from and written back to DEFAULT_TABLE unless told otherwise
+SQLITE_EXTENSIONS = ('.db', '.sqlite', '.sqlite3')
+DEFAULT_TABLE = 'customers'
+BATCH_SIZE = 50000  # Rows per executemany call when writing results back
+ROWID = '_rowid'  # Index of a frame read by open_sqlite, the rowid every row is written back to
+# Columns a draw or raffle writes back, with the default they get when added to a table
+RESULT_COLUMNS = {'Winner': 'DEFAULT 0', 'Seat': '', 'Wins': 'DEFAULT 0'}
+
+MASK64 = (1 << 64) - 1
+
+def quote(name):
+    # Quote a table or column name for use in SQL
+    return '"' + name.replace('"', '""') + '"'
+
+def key_function(seed):
+    """ returns draw_key(rowid, chances) = -ln(u) / chances, where u in (0, 1] is the splitmix64
+    hash of (seed, rowid), so a row's key does not depend on the order SQLite scans the table in
+    """
+    base = (seed * 0x9E3779B97F4A7C15) & MASK64
+    log = math.log
+
+    def draw_key(rowid, chances):
+        # Called once per row, so everything is inlined
+        x = (base + rowid * 0xBF58476D1CE4E5B9) & MASK64
+        x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+        x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & MASK64
+        return -log((((x ^ (x >> 31)) >> 11) + 1) * 1.1102230246251565e-16) / chances
+    return draw_key
+
+def ensure_result_columns(conn, table, columns=('Winner', 'Seat')):
+    # Adding a column with a constant default does not rewrite the table
+    existing = {row[1] for row in conn.execute(f"PRAGMA table_info({quote(table)})")}
+    for column in columns:
+        if column not in existing:
+            conn.execute(f"ALTER TABLE {quote(table)} ADD COLUMN {column} {RESULT_COLUMNS[column]}")
+
+def column_values(series):
+    # Values sqlite3 can bind: "?" stays text, flags and counts become integers, empty cells NULL
+    if series.name == 'Winner':
+        return [None if pd.isna(value) else value if value == "?" else int(value) for value in series.tolist()]
+    return series.astype('Int64').astype(object).where(series.notna(), None).tolist()
+
+def open_sqlite(file_name, table=DEFAULT_TABLE):
+    # The rowid becomes the index, which survives sorting and is never written to Excel or CSV
+    with sqlite3.connect(file_name) as conn:
+        return pd.read_sql_query(f"SELECT rowid AS {ROWID}, * FROM {quote(table)}", conn, index_col=ROWID)
+
+def row_ids(conn, df, table):
+    # rowids of a frame that was not read by open_sqlite, matched on CustomerNumber in one pass
+    ids = pd.read_sql_query(f"SELECT rowid AS {ROWID}, CustomerNumber FROM {quote(table)}", conn)
+    ids = ids.drop_duplicates('CustomerNumber').set_index('CustomerNumber')[ROWID]
+    found = ids.reindex(df['CustomerNumber'])
+    if found.isna().any():
+        raise ValueError(f"Customers missing from SQLite table {table}")
+    return found.astype('int64').tolist()
+
+def save_sqlite(df, file_name, table=DEFAULT_TABLE):
+    """ writes the Winner, Seat and Wins columns df has back to their rows by rowid, in batches
+    of executemany inside a single transaction
+    """
+    columns = [column for column in RESULT_COLUMNS if column in df]
+    if not columns:
+        raise ValueError("No Winner, Seat or Wins column to save")
+    values = [column_values(df[column]) for column in columns]
+    conn = sqlite3.connect(file_name)
+    try:
+        with conn:
+            ensure_result_columns(conn, table, columns)
+            ids = df.index.astype('int64').tolist() if df.index.name == ROWID else row_ids(conn, df, table)
+            rows = list(zip(*values, ids))
+            assignments = ", ".join(f"{column} = ?" for column in columns)
+            sql = f"UPDATE {quote(table)} SET {assignments} WHERE rowid = ?"
+            for start in range(0, len(rows), BATCH_SIZE):
+                conn.executemany(sql, rows[start:start + BATCH_SIZE])
+    finally:
+        conn.close()
+
+def read_results(file_name, table=DEFAULT_TABLE):
+    # CustomerNumber, Winner and Seat of every row for the seat index, rows without a seat get 0
+    with sqlite3.connect(file_name) as conn:
+        return pd.read_sql_query(
+            f"SELECT CustomerNumber, Winner, coalesce(Seat, 0) AS Seat FROM {quote(table)}", conn)
+
+def draw_sqlite(file_name, num_tickets, num_entered, seed, table=DEFAULT_TABLE):
+    """ weighted draw without replacement inside the database. Every row gets the exponential race
+    key -ln(u) / Chances and SQLite keeps the num_tickets smallest, so only the winners reach Python.
+    Winners get Winner 1 and the first seats by Chances, highest first, like apply_draw. Everyone
+    else gets Winner 0 and, unlike apply_draw, no seat, so the rest of the table is left alone. In
+    the 'use all' case (num_tickets is ignored) every row is drawn, marked "?" and seated in draw order.
+    Only rows that held a seat or another Winner value are reset, so a redraw writes the old and
+    new winners rather than the whole table. Returns the winners' rowids in draw order.
+    """
+    conn = sqlite3.connect(file_name)
+    try:
+        conn.create_function('draw_key', 2, key_function(seed), deterministic=True)
+        with conn:
+            ensure_result_columns(conn, table)
+            total = conn.execute(f"SELECT count(*) FROM {quote(table)} WHERE Chances > 0").fetchone()[0]
+            if not num_entered:
+                num_tickets = total
+            if num_tickets > total:
+                raise ValueError("Fewer customers with non-zero Chances than number of tickets")
+            drawn = conn.execute(
+                f"SELECT rowid, Chances FROM {quote(table)} WHERE Chances > 0 ORDER BY draw_key(rowid, Chances), rowid LIMIT ?",
+                (num_tickets,)).fetchall()
+            order = [rowid for rowid, _ in drawn]
+            # A stable sort keeps draw order between winners with the same Chances
+            seated = [rowid for rowid, _ in sorted(drawn, key=lambda row: -row[1])] if num_entered else order
+            reset = 0 if num_entered else "?"
+            conn.execute(f"UPDATE {quote(table)} SET Winner = ?, Seat = NULL WHERE Seat IS NOT NULL OR Winner IS NOT ?",
+                         (reset, reset))
+            sql = f"UPDATE {quote(table)} SET Winner = ?, Seat = ? WHERE rowid = ?"
+            winner = 1 if num_entered else "?"
+            for start in range(0, len(order), BATCH_SIZE):
+                conn.executemany(sql, ((winner, start + i + 1, rowid)
+                                       for i, rowid in enumerate(seated[start:start + BATCH_SIZE])))
+        logging.info(f"Drew {len(order)} winners in SQLite table {table} of {file_name}, seed: {seed}")
+        return order
+    finally:
+        conn.close()
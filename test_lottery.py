@@ -0,0 +1,645 @@
+import argparse
+import itertools
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+import zipfile
+import numpy as np
+import pandas as pd
+import cards
+import cli
+import sqlite_store
+import watch
+from history import Draw, DrawHistory, diff_draws
+
+# Two sided normal quantile for a false alarm rate of 0.1%. Every draw below is seeded,
+# so a test either always passes or always fails.
+Z_CRITICAL = 3.0902
+
+def chi2_critical(dof):
+    # Wilson-Hilferty approximation of the chi-square quantile, good to a few percent for dof >= 3
+    return dof * (1 - 2 / (9 * dof) + Z_CRITICAL * np.sqrt(2 / (9 * dof))) ** 3
+
+def chi2_statistic(observed, expected):
+    expected = np.asarray(expected, dtype=np.float64)
+    return (((np.asarray(observed) - expected) ** 2) / expected).sum()
+
+def exact_subset_probabilities(weights, k):
+    """ returns {winner set: probability} of drawing k rows without replacement, by enumeration
+    """
+    probabilities = {}
+    total = weights.sum()
+    for sequence in itertools.permutations(range(len(weights)), k):
+        p, remaining = 1.0, total
+        for row in sequence:
+            p *= weights[row] / remaining
+            remaining -= weights[row]
+        key = frozenset(sequence)
+        probabilities[key] = probabilities.get(key, 0.0) + p
+    return probabilities
+
+def make_list(n, seed=0, chances=(1, 2, 5, 10)):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'CustomerNumber': rng.choice(10 ** 9, n, replace=False) + 10 ** 9,
+        'Chances': rng.choice(chances, n),
+    })
+
+class OpenSaveTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.df = make_list(50)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.tmp.name, name)
+
+    def test_round_trip_csv(self):
+        cli.save_to_file(self.df, self.path('list.csv'), 'csv')
+        df, file_type = cli.open_file(self.path('list.csv'))
+        self.assertEqual(file_type, 'csv')
+        self.assertEqual(sorted(df['CustomerNumber']), sorted(self.df['CustomerNumber']))
+        # Opened lists are sorted by Chances, highest first
+        self.assertTrue(df['Chances'].is_monotonic_decreasing)
+
+    def test_round_trip_excel(self):
+        cli.save_to_file(self.df, self.path('list.xlsx'), 'excel')
+        df, file_type = cli.open_file(self.path('list.xlsx'))
+        self.assertEqual(file_type, 'excel')
+        self.assertEqual(len(df), len(self.df))
+
+    def test_round_trip_compressed(self):
+        for name in ('list.csv.gz', 'list.csv.bz2', 'list.zip'):
+            cli.save_to_file(self.df, self.path(name), 'csv')
+            df, file_type = cli.open_file(self.path(name))
+            self.assertEqual(file_type, 'csv')
+            self.assertEqual(sorted(df['CustomerNumber']), sorted(self.df['CustomerNumber']))
+        with zipfile.ZipFile(self.path('list.zip')) as archive:
+            self.assertEqual(archive.namelist(), ['list.csv'])
+
+    def test_multi_member_zip(self):
+        with zipfile.ZipFile(self.path('parts.zip'), 'w', zipfile.ZIP_DEFLATED) as archive:
+            for i in range(3):
+                archive.writestr(f'part{i}.csv', self.df.iloc[i::3].to_csv(index=False))
+            archive.writestr('readme.txt', 'not a list')
+        df, _ = cli.open_file(self.path('parts.zip'))
+        self.assertEqual(sorted(df['CustomerNumber']), sorted(self.df['CustomerNumber']))
+
+    def test_unsupported_format(self):
+        with self.assertRaises(ValueError):
+            cli.open_file(self.path('list.txt'))
+        with self.assertRaises(ValueError):
+            cli.save_to_file(self.df, self.path('list.txt'), 'txt')
+
+    def test_missing_file(self):
+        with self.assertRaises(ValueError):
+            cli.open_file(self.path('missing.csv'))
+
+class GenerateTicketsTests(unittest.TestCase):
+    def setUp(self):
+        self.df = make_list(200).sort_values(by='Chances', ascending=False)
+
+    def test_given_count(self):
+        df = cli.generate_tickets(self.df.copy(), 30, True, seed=1)
+        self.assertEqual(df['Winner'].sum(), 30)
+        # Winners take the first seats, every row gets a seat
+        self.assertTrue(df['Winner'].iloc[:30].all())
+        self.assertEqual(list(df['Seat']), list(range(1, 201)))
+
+    def test_use_all(self):
+        df = cli.generate_tickets(self.df.copy(), len(self.df), False, seed=1)
+        self.assertTrue((df['Winner'] == "?").all())
+        self.assertEqual(sorted(df['Seat']), list(range(1, 201)))
+
+    def test_seed_repeats_draw(self):
+        a = cli.generate_tickets(self.df.copy(), 30, True, seed=7)
+        b = cli.generate_tickets(self.df.copy(), 30, True, seed=7)
+        c = cli.generate_tickets(self.df.copy(), 30, True, seed=8)
+        self.assertTrue(a.equals(b))
+        self.assertFalse(a['CustomerNumber'].equals(c['CustomerNumber']))
+
+    def test_invalid_counts(self):
+        for num_tickets in (0, -3, 201):
+            with self.assertRaises(ValueError):
+                cli.generate_tickets(self.df.copy(), num_tickets, True, seed=1)
+
+    def test_zero_chances_never_win(self):
+        df = self.df.copy()
+        df.loc[df.index[:100], 'Chances'] = 0
+        zero = set(df['CustomerNumber'].iloc[:100])
+        for seed in range(20):
+            result = cli.generate_tickets(df.copy(), 100, True, seed=seed)
+            self.assertFalse(zero & set(result.loc[result['Winner'], 'CustomerNumber']))
+        with self.assertRaises(ValueError):
+            cli.generate_tickets(df.copy(), 101, True, seed=1)
+
+class DrawEngineTests(unittest.TestCase):
+    weights = np.array([1.0, 2, 3, 5, 8, 10])
+
+    def test_keys_are_independent_of_slicing(self):
+        weights = np.random.default_rng(0).random(1000)
+        keys = cli.draw_keys(weights, 5)
+        np.testing.assert_array_equal(cli.draw_keys(weights[300:], 5, 300), keys[300:])
+
+    def test_sharded_matches_single_process(self):
+        weights = np.random.default_rng(0).random(5000)
+        single = cli.draw_order(weights, 300, 11, engine="keys", block_size=1000)
+        sharded = cli.draw_order(weights, 300, 11, workers=2, engine="keys", block_size=1000)
+        np.testing.assert_array_equal(single, sharded)
+        np.testing.assert_array_equal(cli.sharded_draw_order(weights, 300, 11, 3, block_size=1000), single)
+
+    def test_tier_engine_needs_few_values(self):
+        with self.assertRaises(ValueError):
+            cli.draw_order(np.arange(1.0, 400.0), 3, 1, engine="tiers")
+
+    def test_auto_engine_choice(self):
+        weights = make_list(10000)['Chances'].to_numpy(dtype=np.float64)
+        # A few seats from a few values are drawn by tier, 'use all' by key
+        np.testing.assert_array_equal(cli.draw_order(weights, 10, 3), cli.draw_order(weights, 10, 3, engine="tiers"))
+        np.testing.assert_array_equal(cli.draw_order(weights, 10000, 3), cli.draw_order(weights, 10000, 3, engine="keys"))
+        self.assertIsNone(cli.build_tiers(np.arange(1.0, 10001.0)))
+        weights[5] = np.nan
+        with self.assertRaises(ValueError):
+            cli.draw_order(weights, 10, 3)
+
+    def test_table_cache(self):
+        weights = make_list(1000)['Chances'].to_numpy(dtype=np.float64)
+        try:
+            tiers = cli.tier_table(weights, cache_key='list')
+            self.assertIs(cli.tier_table(weights, cache_key='list'), tiers)
+            self.assertIsNot(cli.tier_table(weights), tiers)
+            # A different length under the same key is rebuilt rather than reused
+            self.assertEqual(sum(map(len, cli.tier_table(weights[:10], cache_key='list')[1])), 10)
+        finally:
+            cli._tables.clear()
+
+    def assert_subset_frequencies(self, engine, k, draws=5000):
+        expected = exact_subset_probabilities(self.weights, k)
+        subsets = list(expected)
+        counts = dict.fromkeys(subsets, 0)
+        for seed in range(draws):
+            counts[frozenset(cli.draw_order(self.weights, k, seed, engine=engine).tolist())] += 1
+        observed = [counts[subset] for subset in subsets]
+        statistic = chi2_statistic(observed, [expected[subset] * draws for subset in subsets])
+        self.assertLess(statistic, chi2_critical(len(subsets) - 1))
+
+    def test_keys_winner_sets(self):
+        self.assert_subset_frequencies("keys", 3)
+
+    def test_tiers_winner_sets(self):
+        self.assert_subset_frequencies("tiers", 3)
+
+    def test_first_seat_frequencies(self):
+        # The first seat of a 'use all' draw is a single weighted pick
+        draws = 5000
+        for engine in ("keys", "tiers"):
+            first = [cli.draw_order(self.weights, len(self.weights), seed, engine=engine)[0] for seed in range(draws)]
+            observed = np.bincount(first, minlength=len(self.weights))
+            expected = self.weights / self.weights.sum() * draws
+            self.assertLess(chi2_statistic(observed, expected), chi2_critical(len(self.weights) - 1))
+
+    def test_alias_frequencies(self):
+        weights = np.random.default_rng(3).choice([1.0, 2, 5, 10], 40)
+        prob, alias = cli.build_alias_table(weights)
+        draws = 200000
+        observed = np.bincount(cli.alias_sample(prob, alias, draws, np.random.default_rng(4)), minlength=len(weights))
+        expected = weights / weights.sum() * draws
+        self.assertLess(chi2_statistic(observed, expected), chi2_critical(len(weights) - 1))
+
+    def test_alias_table_is_exact(self):
+        # Every row's own share plus what other columns alias to it adds up to its probability
+        for weights in (self.weights, np.array([0.0, 0, 1]), np.random.default_rng(1).random(10000) ** 4,
+                        np.random.default_rng(2).choice([0.0, 1, 2, 5, 10], 1000)):
+            prob, alias = cli.build_alias_table(weights)
+            self.assertTrue(((prob >= 0) & (prob <= 1)).all())
+            mass = (prob + np.bincount(alias, weights=1 - prob, minlength=len(weights))) / len(weights)
+            np.testing.assert_allclose(mass, weights / weights.sum(), atol=1e-12)
+
+    def test_prizes(self):
+        listed = make_list(100)
+        df = cli.generate_prizes(listed, 500, seed=2)
+        self.assertEqual(df['Wins'].sum(), 500)
+        self.assertTrue(df['Wins'].is_monotonic_decreasing)
+        self.assertNotIn('Wins', listed)
+
+    def test_weighted_random_selection(self):
+        items = np.arange(100, 106)
+        for replace in (False, True):
+            first = cli.weighted_random_selection(items, self.weights, 4, replace=replace, seed=5)
+            np.testing.assert_array_equal(first, cli.weighted_random_selection(items, self.weights, 4, replace=replace, seed=5))
+        self.assertEqual(len(set(cli.weighted_random_selection(items, self.weights, 6, seed=1))), 6)
+
+class RankingTests(unittest.TestCase):
+    def test_nested_winners(self):
+        df = make_list(200).sort_values(by='Chances', ascending=False)
+        df.loc[df.index[:5], 'Chances'] = 0
+        customers = cli.draw_ranking(df, seed=6)
+        self.assertEqual(len(customers), 195)
+        # A reloaded list in another row order still maps to the same customers
+        shuffled = df.sample(frac=1, random_state=1)
+        with tempfile.TemporaryDirectory() as tmp:
+            cli.save_ranking(os.path.join(tmp, 'order.npz'), customers, 6, df)
+            seed, loaded = cli.load_ranking(os.path.join(tmp, 'order.npz'), shuffled)
+            # An edited list no longer matches the ranking drawn from it
+            edited = df.copy()
+            edited.loc[edited.index[50], 'Chances'] += 1
+            for changed in (edited, df.iloc[1:]):
+                with self.assertRaises(ValueError):
+                    cli.load_ranking(os.path.join(tmp, 'order.npz'), changed)
+        self.assertEqual(seed, 6)
+        positions = cli.ranking_positions(shuffled, loaded)
+        previous = set()
+        for k in (20, 50, 120):
+            result = cli.apply_draw(shuffled, positions[:k], True)
+            winners = set(result.loc[result['Winner'], 'CustomerNumber'])
+            self.assertEqual(len(winners), k)
+            self.assertTrue(previous <= winners)
+            previous = winners
+        # The ranking's prefix is the same draw as a key engine draw of k tickets
+        order = cli.draw_order(df['Chances'].to_numpy(), 50, 6, engine="keys")
+        np.testing.assert_array_equal(df['CustomerNumber'].to_numpy()[order], customers[:50])
+        with self.assertRaises(ValueError):
+            cli.ranking_positions(make_list(10, seed=9), customers)
+        # Rows are found by CustomerNumber, so a customer listed twice is refused with a clear message
+        duplicated = pd.concat([df, df.iloc[:1]])
+        for call in (lambda: cli.draw_ranking(duplicated, seed=6), lambda: cli.ranking_positions(duplicated, customers)):
+            with self.assertRaisesRegex(ValueError, "more than once"):
+                call()
+
+    def test_whatif_apply(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            file_name = os.path.join(tmp, 'list.csv')
+            make_list(50).to_csv(file_name, index=False)
+            for apply in (-3, 0, 51, 10):
+                cli.run_whatif(argparse.Namespace(file=file_name, tickets=[], apply=apply, redraw=False,
+                                                  seed=3, workers=1))
+                # Out of range counts leave the list untouched
+                self.assertEqual('Winner' in pd.read_csv(file_name), apply == 10)
+            self.assertEqual(pd.read_csv(file_name)['Winner'].sum(), 10)
+
+class PastWinnersTests(unittest.TestCase):
+    def test_dampening(self):
+        df = make_list(100).sort_values(by='Chances', ascending=False)
+        with tempfile.TemporaryDirectory() as tmp:
+            seasons = []
+            for seed in range(2):
+                path = os.path.join(tmp, f'season{seed}.csv')
+                cli.save_to_file(cli.generate_tickets(df.copy(), 40, True, seed=seed), path, 'csv')
+                seasons.append(path)
+            index_path = os.path.join(tmp, 'past.npy')
+            cli.build_winner_index(seasons[:1], index_path)
+            index = cli.build_winner_index(seasons[1:], index_path, existing=index_path)
+            weights = cli.dampened_weights(df, index_path, 0.5)
+            empty_path = os.path.join(tmp, 'empty.npy')
+            cli.build_winner_index([], empty_path)
+            np.testing.assert_array_equal(cli.dampened_weights(df, empty_path, 0.5), df['Chances'])
+        wins = dict(zip(index['customer'].tolist(), index['wins'].tolist()))
+        self.assertEqual(sum(wins.values()), 80)
+        expected = [chances * 0.5 ** wins.get(customer, 0) for customer, chances in zip(df['CustomerNumber'], df['Chances'])]
+        np.testing.assert_allclose(weights, expected)
+        with self.assertRaises(ValueError):
+            cli.dampened_weights(df, index_path, 1.5)
+
+    def test_dampened_prizes(self):
+        # A raffle draws from the dampened weights, not the Chances column
+        df = make_list(100)
+        weights = np.where(np.arange(100) < 50, 0.0, df['Chances'])
+        result = cli.generate_prizes(df, 500, seed=2, weights=weights)
+        self.assertEqual(result['Wins'].sum(), 500)
+        self.assertEqual(result.loc[result.index < 50, 'Wins'].sum(), 0)
+
+class StratifiedTests(unittest.TestCase):
+    def setUp(self):
+        self.df = make_list(300)
+        self.df['Tier'] = np.random.default_rng(5).choice(['Gold', 'Silver', 'Bronze'], 300)
+        self.df.loc[:4, 'Tier'] = None
+
+    def test_quotas(self):
+        silver = (self.df['Tier'] == 'Silver').sum()
+        df = cli.generate_stratified(self.df.copy(), 'Tier', {'Silver': '10%', 'Gold': 15}, seed=3)
+        winners = df[df['Winner']]
+        self.assertEqual((winners['Tier'] == 'Gold').sum(), 15)
+        self.assertEqual((winners['Tier'] == 'Silver').sum(), round(silver * 0.1))
+        self.assertEqual(len(winners), 15 + round(silver * 0.1))
+        # Seats run on from group to group in quota order, winners first
+        self.assertEqual(list(df['Seat']), list(range(1, 301)))
+        self.assertEqual(list(winners['Tier'].iloc[:round(silver * 0.1)]), ['Silver'] * round(silver * 0.1))
+        self.assertTrue(df['Winner'].iloc[:len(winners)].all())
+
+    def test_bad_quotas(self):
+        with self.assertRaises(ValueError):
+            cli.generate_stratified(self.df.copy(), 'Tier', {'Platinum': 5}, seed=3)
+        with self.assertRaises(ValueError):
+            cli.generate_stratified(self.df.copy(), 'Tier', {'Gold': 300}, seed=3)
+        # Negative Chances would sort first in its group, it is rejected like in any other draw
+        df = self.df.copy()
+        df.loc[10, 'Chances'] = -5
+        with self.assertRaises(ValueError):
+            cli.generate_stratified(df, 'Tier', {'Gold': 1}, seed=3)
+
+    def test_numeric_groups(self):
+        # A numeric column with blank cells is read as floats, quotas still name the groups as 1, 2
+        with tempfile.TemporaryDirectory() as tmp:
+            df = self.df.assign(Region=np.where(self.df['Tier'].isna(), None, np.arange(300) % 2 + 1))
+            df.to_csv(os.path.join(tmp, 'list.csv'), index=False)
+            df, _ = cli.open_file(os.path.join(tmp, 'list.csv'))
+        self.assertEqual(df['Region'].dtype, np.float64)
+        result = cli.generate_stratified(df, 'Region', {'1': 5, 2: 3}, seed=3)
+        winners = result[result['Winner']]
+        self.assertEqual(list(winners['Region']), [1.0] * 5 + [2.0] * 3)
+
+    def test_group_frequencies(self):
+        # Within a group the draw is the usual weighted draw, check the first pick of a 1 seat quota
+        weights = np.array([1.0, 2, 3, 5, 8, 10])
+        df = pd.DataFrame({'CustomerNumber': np.arange(12), 'Chances': np.tile(weights, 2),
+                           'Tier': ['A'] * 6 + ['B'] * 6})
+        draws = 3000
+        picks = []
+        for seed in range(draws):
+            result = cli.generate_stratified(df.copy(), 'Tier', {'B': 1}, seed=seed)
+            picks.append(result['CustomerNumber'].iloc[0] - 6)
+        observed = np.bincount(picks, minlength=6)
+        expected = weights / weights.sum() * draws
+        self.assertLess(chi2_statistic(observed, expected), chi2_critical(5))
+
+class JointDrawTests(unittest.TestCase):
+    def setUp(self):
+        shared = make_list(60, seed=1)
+        self.first = pd.concat([shared, make_list(20, seed=2)], ignore_index=True)
+        self.second = pd.concat([make_list(20, seed=3), shared], ignore_index=True)
+
+    def winners(self, df):
+        return set(df.loc[df['Winner'] == True, 'CustomerNumber'])
+
+    def test_win_limit(self):
+        for seed in range(10):
+            first, second = cli.joint_draw([(self.first.copy(), 50), (self.second.copy(), 30)], seed=seed)
+            self.assertEqual(len(self.winners(first)), 50)
+            self.assertEqual(len(self.winners(second)), 30)
+            self.assertFalse(self.winners(first) & self.winners(second))
+
+    def test_higher_limit(self):
+        first, second = cli.joint_draw([(self.first.copy(), 80), (self.second.copy(), 80)], win_limit=2, seed=1)
+        self.assertEqual(len(self.winners(first) & self.winners(second)), 60)
+
+    def test_not_enough_customers(self):
+        first, second = cli.joint_draw([(self.first.copy(), 80), (self.second.copy(), 50)], seed=1)
+        # Everyone in the first lottery won, only the 20 customers unique to the second are left
+        self.assertEqual(len(self.winners(second)), 20)
+
+    def test_invalid_chances(self):
+        for chances in (-5, np.nan):
+            first = self.first.copy()
+            first.loc[first.index[0], 'Chances'] = chances
+            with self.assertRaises(ValueError):
+                cli.joint_draw([(first, 1), (self.second.copy(), 1)], seed=1)
+
+class HistoryTests(unittest.TestCase):
+    def draw(self, seed, k=5):
+        return Draw(seed, k, True, cli.draw_order(np.ones(20), k, seed).astype(np.int32))
+
+    def test_undo_redo(self):
+        history = DrawHistory(capacity=3)
+        for seed in range(4):
+            history.push(self.draw(seed))
+        self.assertEqual(len(history.draws), 3)
+        self.assertEqual(history.undo().seed, 2)
+        self.assertEqual(history.redo().seed, 3)
+        history.undo()
+        history.push(self.draw(9))
+        self.assertFalse(history.can_redo())
+        self.assertEqual([draw.seed for draw in history.draws], [1, 2, 9])
+
+    def test_restore_leaves_list_untouched(self):
+        # Undo and redo rebuild a draw from the loaded list, so applying a draw must not change it
+        base = make_list(20)
+        loaded = base.copy()
+        first, second = self.draw(1), self.draw(2, k=20)
+        shown = cli.apply_draw(base, first.order, first.num_entered)
+        cli.apply_draw(base, second.order, False)
+        pd.testing.assert_frame_equal(base, loaded)
+        pd.testing.assert_frame_equal(cli.apply_draw(base, first.order, first.num_entered), shown)
+
+    def test_save_load_and_diff(self):
+        base = make_list(20)
+        history = DrawHistory()
+        history.push(self.draw(1))
+        history.push(self.draw(2))
+        with tempfile.TemporaryDirectory() as tmp:
+            # The drawn file is saved sorted by Winner and re-sorted when opened again
+            file_name = os.path.join(tmp, 'list.csv')
+            cli.save_to_file(cli.apply_draw(base, history.current().order, True), file_name, 'csv')
+            reopened, _ = cli.open_file(file_name)
+            history.save(os.path.join(tmp, 'draws.npz'), base)
+            loaded = DrawHistory()
+            loaded.load(os.path.join(tmp, 'draws.npz'), reopened)
+            edited = base.copy()
+            edited.loc[3, 'Chances'] += 1
+            for changed in (edited, base.iloc[1:]):
+                with self.assertRaises(ValueError):
+                    loaded.load(os.path.join(tmp, 'draws.npz'), changed)
+        self.assertEqual(loaded.position, 1)
+        customers = base['CustomerNumber'].to_numpy()
+        for a, b in zip(history.draws, loaded.draws):
+            np.testing.assert_array_equal(customers[a.order], reopened['CustomerNumber'].to_numpy()[b.order])
+        rows, _, _ = diff_draws(history.draws[0], history.draws[1], 20)
+        expected = set(history.draws[0].order.tolist()) ^ set(history.draws[1].order.tolist())
+        self.assertEqual(set(rows.tolist()), expected)
+
+class SeatIndexTests(unittest.TestCase):
+    def test_lookup(self):
+        df = cli.generate_tickets(make_list(100).sort_values(by='Chances', ascending=False), 10, True, seed=3)
+        index = cli.build_seat_index(df)
+        with tempfile.TemporaryDirectory() as tmp:
+            cli.save_seat_index(df, os.path.join(tmp, 'seats.npy'))
+            customers = df['CustomerNumber'].tolist()[::7] + [1]
+            found = cli.lookup_seats(os.path.join(tmp, 'seats.npy'), customers)
+        self.assertIsNone(found.pop(1))
+        for customer, (seat, winner) in found.items():
+            self.assertEqual(index[customer], (seat, winner))
+
+class SeatCardTests(unittest.TestCase):
+    def test_barcode_bars(self):
+        # Every Code 39 character is 6 narrow and 3 wide elements, 13.5 narrow units
+        for char, pattern in cards.CODE39.items():
+            self.assertEqual(pattern.count('w'), 3, char)
+        bars, length = cards.barcode_bars("0")
+        self.assertEqual(length, 3 * 13.5 + 2)
+        self.assertEqual(bars, [(0.0, 1.0), (3.5, 1.0), (5.5, 2.5), (9.0, 2.5), (12.5, 1.0),  # *
+                                (14.5, 1.0), (16.5, 1.0), (20.0, 2.5), (23.5, 2.5), (27.0, 1.0),  # 0
+                                (29.0, 1.0), (32.5, 1.0), (34.5, 2.5), (38.0, 2.5), (41.5, 1.0)])  # *
+
+    def test_card_rows(self):
+        df = make_list(20).sort_values(by='Chances', ascending=False)
+        df['Section'] = np.arange(20) % 3
+        given = cli.generate_tickets(df, 5, True, seed=1)
+        rows = cards.card_rows(given.sample(frac=1, random_state=2))
+        self.assertEqual([seat for _, _, seat in rows], [1, 2, 3, 4, 5])
+        winners = given[given['Winner'] == True].set_index('CustomerNumber')
+        self.assertEqual({customer for customer, _, _ in rows}, set(winners.index))
+        self.assertTrue(all(section == str(winners.loc[customer, 'Section']) for customer, section, _ in rows))
+        # In the 'use all' case every row is seated and gets a card
+        rows = cards.card_rows(cli.generate_tickets(df.drop(columns='Section'), 20, False, seed=1))
+        self.assertEqual([seat for _, _, seat in rows], list(range(1, 21)))
+        self.assertEqual({section for _, section, _ in rows}, {""})
+
+    def test_render_cards(self):
+        df = cli.generate_tickets(make_list(40).sort_values(by='Chances', ascending=False), 25, True, seed=1)
+        with tempfile.TemporaryDirectory() as tmp:
+            files = cards.render_cards(df, tmp, cards_per_page=10, pages_per_file=1, workers=1)
+            self.assertEqual([os.path.basename(name) for name in files],
+                             ['seat_cards_0001.pdf', 'seat_cards_0002.pdf', 'seat_cards_0003.pdf'])
+            self.assertEqual(sorted(os.listdir(tmp)), [os.path.basename(name) for name in files])
+            self.assertTrue(all(os.path.getsize(name) > 0 for name in files))
+
+class SqliteTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = os.path.join(self.tmp.name, 'list.db')
+        self.df = make_list(100)
+        self.df.loc[:9, 'Chances'] = 0
+        with sqlite3.connect(self.db) as conn:
+            self.df.to_sql('customers', conn, index=False)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def results(self):
+        with sqlite3.connect(self.db) as conn:
+            return pd.read_sql_query("SELECT CustomerNumber, Chances, Winner, Seat FROM customers", conn)
+
+    def test_round_trip(self):
+        df, file_type = cli.open_file(self.db)
+        self.assertEqual(file_type, 'sqlite')
+        df = cli.generate_tickets(df, 20, True, seed=1)
+        cli.save_to_file(df, self.db, file_type)
+        results = self.results().set_index('CustomerNumber')
+        expected = df.set_index('CustomerNumber')
+        self.assertEqual(results['Winner'].sum(), 20)
+        self.assertTrue((results['Seat'] == expected.loc[results.index, 'Seat']).all())
+
+    def test_save_large_list(self):
+        # Writing back by rowid is linear, a lookup by CustomerNumber would scan the table per row
+        df = make_list(100000)
+        with sqlite3.connect(self.db) as conn:
+            conn.execute("DELETE FROM customers")
+            df.to_sql('customers', conn, index=False, if_exists='append')
+        for frame in (cli.open_file(self.db)[0], df):
+            result = cli.generate_tickets(frame, 1000, True, seed=2)
+            start = time.perf_counter()
+            cli.save_to_file(result, self.db, 'sqlite')
+            self.assertLess(time.perf_counter() - start, 10)
+            results = self.results().set_index('CustomerNumber')
+            self.assertEqual(results['Winner'].sum(), 1000)
+            seats = result.set_index('CustomerNumber')['Seat']
+            self.assertTrue((results['Seat'] == seats.loc[results.index]).all())
+
+    def test_prizes(self):
+        # A draw in the database leaves non-winners without a seat, which must survive the raffle
+        sqlite_store.draw_sqlite(self.db, 30, True, seed=4)
+        df, file_type = cli.open_file(self.db)
+        df = cli.generate_prizes(df, 500, seed=2)
+        cli.save_to_file(df, self.db, file_type)
+        with sqlite3.connect(self.db) as conn:
+            results = pd.read_sql_query("SELECT CustomerNumber, Chances, Wins, Seat FROM customers", conn)
+        self.assertEqual(results['Wins'].sum(), 500)
+        self.assertEqual(results.loc[results['Chances'] == 0, 'Wins'].sum(), 0)
+        self.assertEqual(results['Seat'].notna().sum(), 30)
+
+    def test_draw_in_database(self):
+        order = sqlite_store.draw_sqlite(self.db, 30, True, seed=4)
+        self.assertEqual(order, sqlite_store.draw_sqlite(self.db, 30, True, seed=4))
+        results = self.results()
+        winners = results[results['Winner'] == 1].sort_values(by='Seat')
+        self.assertEqual(list(winners['Seat']), list(range(1, 31)))
+        # Winners are seated by Chances like apply_draw, ties in draw order
+        self.assertTrue(winners['Chances'].is_monotonic_decreasing)
+        drawn = results.set_index(results.index + 1).loc[order]
+        for chances, group in drawn.groupby('Chances'):
+            self.assertTrue(group['Seat'].is_monotonic_increasing)
+        self.assertTrue((winners['Chances'] > 0).all())
+        self.assertTrue(results.loc[results['Winner'] == 0, 'Seat'].isna().all())
+        with self.assertRaises(ValueError):
+            sqlite_store.draw_sqlite(self.db, 91, True, seed=4)
+
+    def test_sqlite_command_saves_seat_index(self):
+        cli.run_sqlite(argparse.Namespace(database=self.db, tickets=5, seed=4, table='customers'))
+        results = self.results()
+        customers = results['CustomerNumber'].tolist()
+        found = cli.lookup_seats(cli.seat_index_path(self.db), customers)
+        for customer, winner, seat in zip(customers, results['Winner'], results['Seat']):
+            self.assertEqual(found[customer], (0 if pd.isna(seat) else int(seat), winner == 1))
+
+    def test_draw_all_in_database(self):
+        sqlite_store.draw_sqlite(self.db, None, False, seed=4)
+        results = self.results()
+        self.assertTrue((results['Winner'] == "?").all())
+        self.assertEqual(sorted(results['Seat'].dropna().astype(int)), list(range(1, 91)))
+
+    def test_first_seat_frequencies(self):
+        weights = np.array([1.0, 2, 3, 5, 8, 10])
+        with sqlite3.connect(self.db) as conn:
+            conn.execute("DELETE FROM customers")
+            conn.executemany("INSERT INTO customers (CustomerNumber, Chances) VALUES (?, ?)",
+                             enumerate(weights.tolist()))
+        draws = 2000
+        first = [sqlite_store.draw_sqlite(self.db, 1, True, seed) for seed in range(draws)]
+        with sqlite3.connect(self.db) as conn:
+            rowids = dict(conn.execute("SELECT rowid, CustomerNumber FROM customers"))
+        observed = np.bincount([rowids[order[0]] for order in first], minlength=len(weights))
+        expected = weights / weights.sum() * draws
+        self.assertLess(chi2_statistic(observed, expected), chi2_critical(len(weights) - 1))
+
+class WatchFolderTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.in_dir = os.path.join(self.tmp.name, 'in')
+        self.out_dir = os.path.join(self.tmp.name, 'out')
+        os.makedirs(self.in_dir)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def status(self, name):
+        with open(os.path.join(self.out_dir, f"{name}.status.json")) as f:
+            return json.load(f)
+
+    def test_process_file(self):
+        make_list(30).to_csv(os.path.join(self.in_dir, 'good.csv'), index=False)
+        with open(os.path.join(self.in_dir, 'bad.csv'), 'w') as f:
+            f.write("no,chances\n1,2\n")
+        watch.process_file(os.path.join(self.in_dir, 'good.csv'), self.out_dir, 5)
+        watch.process_file(os.path.join(self.in_dir, 'bad.csv'), self.out_dir, 5)
+        self.assertEqual(self.status('good.csv')['status'], 'done')
+        self.assertEqual(self.status('bad.csv')['status'], 'failed')
+        self.assertEqual(pd.read_csv(os.path.join(self.out_dir, 'good.csv'))['Winner'].sum(), 5)
+        self.assertTrue(os.path.exists(os.path.join(self.out_dir, 'processed', 'good.csv')))
+        self.assertTrue(os.path.exists(os.path.join(self.out_dir, 'failed', 'bad.csv')))
+        self.assertEqual(os.listdir(self.in_dir), [])
+
+    def test_watch_folder(self):
+        stop = threading.Event()
+        thread = threading.Thread(target=watch.watch_folder, args=(self.in_dir, self.out_dir),
+                                  kwargs=dict(workers=1, settle=0.2, poll=0.05, stop=stop))
+        thread.start()
+        try:
+            make_list(30).to_csv(os.path.join(self.in_dir, 'list.csv'), index=False)
+            open(os.path.join(self.in_dir, '~$list.xlsx'), 'w').close()
+            deadline = time.monotonic() + 20
+            while not os.path.exists(os.path.join(self.out_dir, 'list.csv.status.json')):
+                self.assertLess(time.monotonic(), deadline)
+                time.sleep(0.05)
+        finally:
+            stop.set()
+            thread.join()
+        self.assertEqual(self.status('list.csv')['status'], 'done')
+        self.assertEqual(os.listdir(self.in_dir), ['~$list.xlsx'])
+
+if __name__ == "__main__":
+    unittest.main()
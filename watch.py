@@ -0,0 +1,140 @@
+import json
+import logging
+import os
+import queue
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+from datetime import datetime
+import cli
+
+# watchdog gives native filesystem notifications when it is installed, otherwise the folder is polled
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:
+    Observer = None
+
+def is_input_file(name):
+    # Skip hidden files, Office lock files (~$name.xlsx) and anything open_file cannot read
+    return not name.startswith(('.', '~$')) and name.lower().endswith(cli.INPUT_EXTENSIONS)
+
+def warm_worker():
+    # Import the readers and writers once per worker instead of once per file
+    import openpyxl  # noqa: F401
+    import pandas  # noqa: F401
+
+def process_file(file_path, out_dir, num_tickets=None):
+    """ draws one dropped list and writes the result, its seat index and a status record to out_dir.
+    The input is moved to out_dir/processed, or out_dir/failed if anything went wrong.
+    """
+    name = os.path.basename(file_path)
+    os.makedirs(out_dir, exist_ok=True)
+    status = {'file': name, 'started': datetime.now().isoformat(timespec='seconds')}
+    start = time.perf_counter()
+    try:
+        df, file_type = cli.open_file(file_path)
+        num_entered = num_tickets is not None
+        seed = cli.new_seed()
+        df = cli.generate_tickets(df, num_tickets if num_entered else len(df), num_entered, seed=seed, workers=1)
+        result_path = os.path.join(out_dir, name)
+        cli.save_to_file(df, result_path, file_type)
+        cli.save_seat_index(df, cli.seat_index_path(result_path))
+        status.update(status='done', result=name, seed=str(seed), records=len(df),
+                      num_tickets=num_tickets if num_entered else len(df))
+        destination = 'processed'
+    except Exception as e:
+        status.update(status='failed', error=str(e))
+        destination = 'failed'
+    status['seconds'] = round(time.perf_counter() - start, 3)
+    os.makedirs(os.path.join(out_dir, destination), exist_ok=True)
+    shutil.move(file_path, os.path.join(out_dir, destination, name))
+    with open(os.path.join(out_dir, f"{name}.status.json"), 'w') as f:
+        json.dump(status, f, indent=2)
+    return status
+
+def start_observer(in_dir, events):
+    # Feed created and modified paths into the events queue, or return None to fall back to polling
+    if Observer is None:
+        return None
+
+    class Handler(FileSystemEventHandler):
+        def on_created(self, event):
+            if not event.is_directory:
+                events.put(event.src_path)
+
+        def on_modified(self, event):
+            self.on_created(event)
+
+        def on_moved(self, event):
+            if not event.is_directory:
+                events.put(event.dest_path)
+
+    observer = Observer()
+    observer.schedule(Handler(), in_dir, recursive=False)
+    observer.start()
+    return observer
+
+def scan(in_dir):
+    with os.scandir(in_dir) as entries:
+        return [entry.path for entry in entries if entry.is_file()]
+
+def watch_folder(in_dir, out_dir, num_tickets=None, workers=None, settle=2.0, poll=1.0, stop=None):
+    """ processes every list dropped into in_dir on a pool of pre-warmed worker processes until
+    stop (a threading.Event) is set. A file is picked up once its size and modification time
+    have not changed for `settle` seconds, so partially copied files are left alone.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    workers = workers or os.cpu_count()
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=warm_worker)
+    # Start every worker up front so the first file does not pay for interpreter and pandas startup
+    wait([pool.submit(int) for _ in range(workers)])
+    events = queue.Queue()
+    observer = start_observer(in_dir, events)
+    logging.info(f"Watching {in_dir} with {'notifications' if observer else 'polling'}")
+    pending = {}  # path -> ((size, mtime), time first seen with that size and mtime)
+    running = {}  # future -> path
+    candidates = set(scan(in_dir))
+    try:
+        while stop is None or not stop.is_set():
+            if observer is None:
+                time.sleep(poll)
+                candidates.update(scan(in_dir))
+            else:
+                try:
+                    candidates.add(events.get(timeout=poll))
+                    while True:
+                        candidates.add(events.get_nowait())
+                except queue.Empty:
+                    pass
+            pending.update({path: None for path in candidates
+                            if path not in pending and path not in running.values()
+                            and is_input_file(os.path.basename(path))})
+            candidates.clear()
+
+            now = time.monotonic()
+            for path, seen in list(pending.items()):
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    del pending[path]
+                    continue
+                signature = (stat.st_size, stat.st_mtime_ns)
+                if seen is None or seen[0] != signature:
+                    pending[path] = (signature, now)
+                elif now - seen[1] >= settle:
+                    del pending[path]
+                    running[pool.submit(process_file, path, out_dir, num_tickets)] = path
+
+            for future in [future for future in running if future.done()]:
+                path = running.pop(future)
+                try:
+                    status = future.result()
+                    logging.info(f"Watch folder: {status['file']} {status['status']} in {status['seconds']}s")
+                except Exception as e:
+                    logging.error(f"Watch folder: failed to process {path}: {str(e)}")
+    finally:
+        if observer is not None:
+            observer.stop()
+            observer.join()
+        pool.shutdown(wait=True)